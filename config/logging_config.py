@@ -1,12 +1,129 @@
+import atexit
 import datetime
 import inspect
 import logging
 import logging.config
+import logging.handlers
+import os
+import queue
+import shutil
 import sys
 import time
 from functools import wraps
 from typing import Any, Callable
 
+from pythonjsonlogger import jsonlogger
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson ships with the dspy/litellm stack
+    orjson = None
+
+
+# Log folder timestamp, taken once per process so every log file (and any repeated setup_logging call) shares one folder
+LOG_TIMESTAMP: str = datetime.datetime.now().strftime("%Y-%H-%M")
+
+
+class OrjsonFormatter(jsonlogger.JsonFormatter):
+    """
+    JsonFormatter that serializes log records with orjson, roughly twice as fast as the stdlib json encoder.
+
+    Falls back to the stock python-json-logger serialization if orjson is not installed.
+    """
+
+    def jsonify_log_record(self, log_record: dict[str, Any]) -> str:
+        if orjson is None:
+            return super().jsonify_log_record(log_record)
+        return orjson.dumps(log_record, default=str).decode()
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    FileHandler that writes through a large userspace buffer instead of flushing after every record.
+
+    logging.StreamHandler flushes after each emitted record, which costs one write syscall per log line. This handler
+    only pushes its buffer to the OS when it fills up, on the first record after `flush_interval` seconds, on an
+    explicit flush() (FlushingQueueListener calls it while idle) and on close. The parent directory is created if
+    needed.
+
+    Args:
+        filename (str): Path of the log file.
+        buffer_size (int): Size of the write buffer in bytes. Defaults to 64 KiB.
+        flush_interval (float): Maximum seconds between flushes while records keep arriving. Defaults to 5.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        mode: str = "a",
+        encoding: str | None = None,
+        delay: bool = False,
+        errors: str | None = None,
+        buffer_size: int = 64 * 1024,
+        flush_interval: float = 5.0,
+    ) -> None:
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        super().__init__(filename, mode, encoding, delay, errors)
+
+    def _open(self) -> Any:
+        return open(self.baseFilename, self.mode, buffering=self.buffer_size, encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # FileHandler.emit without StreamHandler's flush after every record: flush once flush_interval has passed
+        if self.stream is None:
+            if self.mode != "w" or not self._closed:
+                self.stream = self._open()
+        if not self.stream:
+            return
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+            return
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        super().flush()
+        self._last_flush = time.monotonic()
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener that also flushes its handlers whenever the queue has been idle for `flush_interval` seconds.
+
+    BufferedFileHandler only checks its flush interval when a record arrives, so without this the records logged just
+    before a quiet period would sit in its buffer until the next record or process exit.
+    """
+
+    flush_interval: float = 5.0
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval if block else None)
+            except queue.Empty:
+                if not block:
+                    raise
+                for handler in self.handlers:
+                    handler.flush()
+
+
+def _close_file_logging(listener: logging.handlers.QueueListener, local_dir: str, dbfs_dir: str) -> None:
+    """Drain the log queue, flush/close the file handlers and copy the finished log files to DBFS."""
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    try:
+        shutil.copytree(local_dir, dbfs_dir, dirs_exist_ok=True)
+    except OSError as e:
+        print(f"Could not copy logs from {local_dir} to {dbfs_dir}: {e}", file=sys.stderr)
+
 
 def setup_logging() -> logging.Logger:
     """
@@ -18,8 +135,9 @@ def setup_logging() -> logging.Logger:
 
     Features:
         - Console Handler: Logs output to the console with a standard formatter.
-        - File Handlers (optional): Logs output to text and JSON files stored in DBFS. File paths are dynamically generated based on the current date and time, and are stored under '/dbfs/sgs/logs/'.
-        - JSON Formatter: Utilizes the python-json-logger module for JSON-formatted logs, facilitating structured logging and easier integration with log analysis tools like DataDog or AWS CloudWatch.
+        - File Handlers (optional): Logs output to text and JSON files stored in DBFS. File paths are dynamically generated based on the current date and time. Files are written locally under '/tmp/sgs/logs/' through buffered handlers (DBFS is slow for many small writes) and copied to '/dbfs/sgs/logs/' at interpreter exit.
+        - JSON Formatter: Utilizes the python-json-logger module (serialized with orjson) for JSON-formatted logs, facilitating structured logging and easier integration with log analysis tools like DataDog or AWS CloudWatch.
+        - Queued File Output: File handlers sit behind a QueueHandler; a background FlushingQueueListener thread does the file I/O (and flushes the buffered files while idle), so logging calls only enqueue the record.
         - Custom Log Levels: Adjusts log levels for certain third-party libraries (e.g., 'py4j', 'pyspark') to reduce unnecessary verbosity.
 
     Note:
@@ -33,6 +151,9 @@ def setup_logging() -> logging.Logger:
     ENABLE_LOG_FILE_OUTPUT: bool = False
     # Log level: Set to "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"
     LOG_LEVEL: str = "DEBUG"
+    # File logs are buffered on local disk and copied to DBFS once at exit
+    LOCAL_LOG_DIR: str = "/tmp/sgs/logs"
+    DBFS_LOG_DIR: str = "/dbfs/sgs/logs"
 
     log_config = {
         "version": 1,
@@ -41,7 +162,7 @@ def setup_logging() -> logging.Logger:
                 "format": "%(asctime)s | %(levelname)s | %(name)s | %(funcName)s | %(message)s"
             },
             "json": {
-                "()": "pythonjsonlogger.jsonlogger.JsonFormatter",
+                "()": OrjsonFormatter,
                 "format": "%(asctime)s %(levelname)s %(name)s %(funcName)s %(message)s",
             },
         },
@@ -63,21 +184,34 @@ def setup_logging() -> logging.Logger:
         log_config["handlers"].update(
             {
                 "file": {
-                    "class": "logging.FileHandler",
-                    "filename": f"/dbfs/sgs/logs/{datetime.datetime.now().strftime('%Y-%H-%M')}/std_logs.log",
+                    "class": BufferedFileHandler,
+                    "filename": f"{LOCAL_LOG_DIR}/{LOG_TIMESTAMP}/std_logs.log",
                     "formatter": "standard",
                 },
                 "json_file": {
-                    "class": "logging.FileHandler",
-                    "filename": f"/dbfs/sgs/logs/{datetime.datetime.now().strftime('%Y-%H-%M')}/json_logs.log",
+                    "class": BufferedFileHandler,
+                    "filename": f"{LOCAL_LOG_DIR}/{LOG_TIMESTAMP}/json_logs.log",
                     "formatter": "json",
                 },
+                # Root only enqueues records; the listener thread (started below) writes them to the files
+                "queue": {
+                    "class": "logging.handlers.QueueHandler",
+                    "handlers": ["file", "json_file"],
+                    "listener": FlushingQueueListener,
+                    "respect_handler_level": True,
+                },
             }
         )
-        log_config["root"]["handlers"].extend(["file", "json_file"])
+        log_config["root"]["handlers"].append("queue")
 
     logging.config.dictConfig(log_config)
 
+    if ENABLE_LOG_FILE_OUTPUT:
+        listener = logging.getHandlerByName("queue").listener
+        listener.start()
+        # Only this run's folder: earlier runs are already on DBFS, and other processes copy their own
+        atexit.register(_close_file_logging, listener, f"{LOCAL_LOG_DIR}/{LOG_TIMESTAMP}", f"{DBFS_LOG_DIR}/{LOG_TIMESTAMP}")
+
     return logging.getLogger()
 
 
@@ -101,14 +235,34 @@ def get_logger(module_name: str) -> logging.Logger:
     return logging.getLogger(module_name)
 
 
+def _summarize_arg(name: str, value: Any) -> str:
+    """
+    Summarize an argument for the call log without stringifying or sizing it: "name=type" plus the shape
+    (DataFrames, arrays, tensors) or length (containers, strings) when the object has one.
+    """
+    type_name = type(value).__name__
+    shape = getattr(value, "shape", None)
+    if isinstance(shape, tuple):
+        return f"{name}={type_name}(shape={shape})"
+    if hasattr(value, "__len__"):
+        try:
+            return f"{name}={type_name}(len={len(value)})"
+        except TypeError:
+            pass
+    return f"{name}={type_name}"
+
+
 def log_function_call(logger: logging.Logger) -> Callable:
     """
     A decorator for logging the call details of a function.
 
     This decorator logs the start and end of a function call, along with the argument names, types,
-    and sizes (in kilobytes). It also logs the calling module.function, called module.function
+    and shapes/lengths (see _summarize_arg). It also logs the calling module.function, called module.function
     and its execution time.
 
+    Logging is only done while DEBUG is enabled for the logger: if it is disabled at decoration time the
+    function is returned undecorated, and at call time the wrapper skips all introspection and formatting.
+
     Args:
         logger (logging.Logger): The logger object to use for logging.
 
@@ -117,61 +271,56 @@ def log_function_call(logger: logging.Logger) -> Callable:
     """
 
     def decorator_log_function_call(func: Callable) -> Callable:
+        if not logger.isEnabledFor(logging.DEBUG):
+            return func
+
+        # Get the module name and argument names of the function being called
+        func_module = func.__module__
+        arg_names = func.__code__.co_varnames[: func.__code__.co_argcount]
+
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not logger.isEnabledFor(logging.DEBUG):
+                return func(*args, **kwargs)
+
             # Get caller's frame
             caller_frame = inspect.currentframe().f_back
 
             # Initialize caller's details
             caller_module, caller_func_name = "Notebook Cell", "Unknown"
 
-            # Check if caller frame exists and extract details
+            # Check if caller frame exists and extract details (module name from the frame's globals is
+            # what inspect.getmodule would resolve, without scanning sys.modules)
             if caller_frame:
-                module = inspect.getmodule(caller_frame)
-                if module:
-                    caller_module = module.__name__
+                caller_module = caller_frame.f_globals.get("__name__") or caller_module
                 caller_func_name = caller_frame.f_code.co_name
 
-            # Get the module name of the function being called
-            func_module = func.__module__
-
-            # Log the start of the function call
-            start_time = time.time()
-
-            # Function to determine if the type is a basic Python data type
-            def is_basic_type(obj):
-                return isinstance(obj, (int, float, str, list, dict, tuple))
-
-            # Prepare a summary of argument names, types, sizes in KB, and values (if basic type)
-            arg_names = func.__code__.co_varnames[: func.__code__.co_argcount]
+            # Prepare a bounded summary of argument names and types (shape/length only, never the values)
             arg_summary = (
                 ", ".join(
-                    [
-                        f"{name}={type(a).__name__} (size: {sys.getsizeof(a) / 1024:.2f} KB, value: {a if is_basic_type(a) else 'Complex Type'})"
-                        for name, a in zip(arg_names, args)
-                    ]
-                    + [
-                        f"{k}={type(v).__name__} (size: {sys.getsizeof(v) / 1024:.2f} KB, value: {v if is_basic_type(v) else 'Complex Type'})"
-                        for k, v in kwargs.items()
-                    ]
+                    [_summarize_arg(name, a) for name, a in zip(arg_names, args)]
+                    + [_summarize_arg(k, v) for k, v in kwargs.items()]
                 )
                 or "None"
             )
 
+            # Log the start of the function call
             logger.debug(
-                f"Function {func_module}.{func.__name__} called by {caller_module}.{caller_func_name} with args: {arg_summary}"
+                "Function %s.%s called by %s.%s with args: %s",
+                func_module, func.__name__, caller_module, caller_func_name, arg_summary,
             )
+            start_time = time.perf_counter()
 
             # Call the actual function
             result = func(*args, **kwargs)
 
             # Calculate execution time
-            end_time = time.time()
-            execution_time = end_time - start_time
+            execution_time = time.perf_counter() - start_time
 
             # Log the end of the function call
             logger.debug(
-                f"Function {func_module}.{func.__name__} called by {caller_module}.{caller_func_name} ended in {execution_time:.4f} seconds"
+                "Function %s.%s called by %s.%s ended in %.4f seconds",
+                func_module, func.__name__, caller_module, caller_func_name, execution_time,
             )
 
             return result
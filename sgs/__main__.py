@@ -1,22 +1,29 @@
 import argparse
-import uvicorn
-
-from sgs.ingest.build_kg import main as build_graph
-from sgs.ingest.build_index import main as build_index
 
 def main():
     p = argparse.ArgumentParser("sgs")
     sub = p.add_subparsers(dest="cmd", required=True)
 
     sub.add_parser("prepare-data")
+    sub.add_parser("build-hnsw")
     sub.add_parser("run-server")
 
     args = p.parse_args()
+    # Import per command: building the vector index pulls in sentence-transformers/torch, the server FastAPI/DSPy
     if args.cmd == "prepare-data":
+        from sgs.ingest.products import main as cache_products
+        from sgs.ingest.build_kg import main as build_graph
+        from sgs.ingest.build_index import main as build_index
+        print("== Caching Products =="); cache_products()
         print("== Building KG =="); build_graph()
         print("== Building Vector Index =="); build_index()
         print("All set.")
+    elif args.cmd == "build-hnsw":
+        from sgs.config import settings
+        from sgs.ingest.build_index import build_hnsw_sibling
+        build_hnsw_sibling(settings.index_dir)
     elif args.cmd == "run-server":
+        import uvicorn
         uvicorn.run("sgs.app:app", host="0.0.0.0", port=8000, reload=False)
 
 if __name__ == "__main__":
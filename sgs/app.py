@@ -1,23 +1,43 @@
 # sgs/app.py
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
 from fastapi import FastAPI
 from pydantic import BaseModel
 import dspy
 
 from sgs.pipeline.program import GroceryRAG
+from sgs.retrievers import kg_retriever, vector_retriever
 from sgs.config import settings
 
-try:
-    dspy.settings.configure(lm=dspy.OpenAI(model=settings.model))
-except Exception:
-    class EchoLM:
-        def __call__(self, *_, **__):
-            class R:
-                def __getattr__(self, _): return "Configure an LM provider (e.g., OpenAI) for answers."
-            return R()
-    dspy.settings.configure(lm=EchoLM())
 
-app = FastAPI(title="Smart Grocery Search (KG-RAG + DSPy)")
-rag = GroceryRAG()
+def _configure_lm():
+    try:
+        dspy.settings.configure(lm=dspy.OpenAI(model=settings.model))
+    except Exception:
+        class EchoLM:
+            def __call__(self, *_, **__):
+                class R:
+                    def __getattr__(self, _): return "Configure an LM provider (e.g., OpenAI) for answers."
+                return R()
+        dspy.settings.configure(lm=EchoLM())
+
+@lru_cache(maxsize=1)
+def get_rag() -> GroceryRAG:
+    """Configure the LM and build the pipeline (product tables, lookups) once per process, on first use."""
+    _configure_lm()
+    return GroceryRAG()
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Warm up at worker startup instead of on the first requests: those run in to_thread workers, and lru_cache
+    # doesn't stop concurrent first callers from each loading the encoder or building the CSR sidecar
+    get_rag()
+    kg_retriever.warm()
+    vector_retriever.warm()
+    yield
+
+app = FastAPI(title="Smart Grocery Search (KG-RAG + DSPy)", lifespan=lifespan)
 
 class AskBody(BaseModel):
     query: str
@@ -27,10 +47,10 @@ def health():
     return {"ok": True}
 
 @app.get("/search")
-def search(q: str):
-    suggestions, ctx = rag.search(q)   # <-- was rag.hybrid(q)
+async def search(q: str):
+    suggestions, ctx = await get_rag().asearch(q)   # <-- was rag.hybrid(q)
     return {"suggestions": suggestions, "contexts": ctx[:10]}
 
 @app.post("/ask")
-def ask(body: AskBody):
-    return rag(body.query)
+async def ask(body: AskBody):
+    return await get_rag().acall(body.query)
@@ -10,13 +10,23 @@ DATA_DIR = ROOT / "sgs" / "data"
 class Settings:
     model: str = os.getenv("DSPY_MODEL", "gpt-4o-mini")  # swap to your provider if needed
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
     use_neo4j: bool = os.getenv("USE_NEO4J", "false").lower() == "true"
     neo4j_uri: str = os.getenv("NEO4J_URI", "bolt://localhost:7687")
     neo4j_user: str = os.getenv("NEO4J_USER", "neo4j")
     neo4j_password: str = os.getenv("NEO4J_PASSWORD", "password")
 
     data_csv: str = os.getenv("DATA_CSV", str(DATA_DIR / "sample_products.csv"))
+    products_cache: str = os.getenv("PRODUCTS_CACHE", str(ARTIFACTS / "products.pkl"))
     index_dir: str = os.getenv("INDEX_DIR", str(ARTIFACTS / "index"))
-    graph_path: str = os.getenv("GRAPH_PATH", str(ARTIFACTS / "graph.pkl"))
+    graph_path: str = os.getenv("GRAPH_PATH", str(ARTIFACTS / "graph.pkl"))  # legacy pickled nx.Graph
+    graph_columns_path: str = os.getenv("GRAPH_COLUMNS_PATH", str(ARTIFACTS / "graph.npz"))
+    graph_csr_dir: str = os.getenv("GRAPH_CSR_DIR", str(ARTIFACTS / "graph.csr"))  # prepared CSR sidecar, written on first load
+
+    # FAISS index_factory spec: HNSW over 8-bit scalar-quantized vectors (4x smaller than fp32) by default;
+    # "HNSW32" keeps fp32 vectors, "Flat" is exact search, "IVF1024,PQ32" suits large catalogs
+    faiss_index: str = os.getenv("FAISS_INDEX", "HNSW32,SQ8")
+    hnsw_ef_construction: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+    hnsw_ef_search: int = int(os.getenv("HNSW_EF_SEARCH", "64"))
 
 settings = Settings()
@@ -1,22 +1,71 @@
-import os, json, pandas as pd
-from sentence_transformers import SentenceTransformer
+import os, json, numpy as np, pandas as pd
 import faiss
 from sgs.config import settings
+from sgs.ingest.products import load_products
+
+TEXT_COLS = ["name", "brand", "category", "sub_category", "ingredients", "attributes", "nutrition_text"]
+HNSW_SIBLING = "products.hnsw.index"
+HNSW_SOURCE = "products.hnsw.source.json"  # identity of the products.index the sibling was built for
+
+def index_source(out_dir: str) -> dict:
+    """Identity (size, mtime) of out_dir/products.index: a products.hnsw.index is only used while this matches."""
+    st = os.stat(os.path.join(out_dir, "products.index"))
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def build_faiss_index(embs: np.ndarray) -> faiss.Index:
+    """Inner-product index over normalized embeddings; HNSW + SQ8 by default (see FAISS_INDEX), trained if the spec needs it."""
+    idx = faiss.index_factory(embs.shape[1], settings.faiss_index, faiss.METRIC_INNER_PRODUCT)
+    if isinstance(idx, faiss.IndexHNSW): idx.hnsw.efConstruction = settings.hnsw_ef_construction
+    if not idx.is_trained: idx.train(embs)
+    idx.add(embs)
+    return idx
+
+def build_hnsw(embs: np.ndarray, m: int = 32, ef_construction: int | None = None) -> faiss.IndexHNSWFlat:
+    """Inner-product HNSW graph over fp32 vectors (upcast if given fp16)."""
+    embs = np.ascontiguousarray(embs, dtype=np.float32)
+    idx = faiss.IndexHNSWFlat(embs.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+    idx.hnsw.efConstruction = ef_construction or settings.hnsw_ef_construction
+    idx.add(embs)
+    return idx
+
+def build_hnsw_sibling(out_dir: str):
+    """
+    Write products.hnsw.index next to an existing products.index, from the stored fp16 embeddings (or the flat
+    index's own vectors for older builds), without re-encoding. The retriever prefers it over a large flat index.
+    """
+    ep = os.path.join(out_dir, "embeddings.f16.npy")
+    if os.path.exists(ep):
+        embs = np.load(ep)
+    else:
+        flat = faiss.read_index(os.path.join(out_dir, "products.index"))
+        embs = flat.reconstruct_n(0, flat.ntotal)
+    faiss.write_index(build_hnsw(embs), os.path.join(out_dir, HNSW_SIBLING))
+    with open(os.path.join(out_dir, HNSW_SOURCE), "w") as f:
+        json.dump(index_source(out_dir), f)
+    print(f"Built HNSW index: {len(embs)} vectors → {out_dir}")
 
 def build_vector_index(df: pd.DataFrame, out_dir: str):
-    model = SentenceTransformer(settings.embedding_model)
-    texts = (df["name"] + " | " + df["brand"] + " | " + df["category"] + " | " + df["sub_category"] + " | " + df["ingredients"].fillna("") + " | " + df["attributes"].fillna("") + " | " + df["nutrition_text"].fillna("")).tolist()
-    embs = model.encode(texts, show_progress_bar=True, normalize_embeddings=True)
-    idx = faiss.IndexFlatIP(embs.shape[1]); idx.add(embs.astype("float32"))
+    import torch  # the encoder stack is only needed here (build-hnsw reuses stored vectors)
+    from sentence_transformers import SentenceTransformer
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = SentenceTransformer(settings.embedding_model, device=device)
+    if device == "cuda": model.half()  # fp16 matmuls on tensor cores; embeddings are normalized anyway
+    parts = df[TEXT_COLS].fillna("")
+    texts = parts[TEXT_COLS[0]].str.cat(parts[TEXT_COLS[1:]], sep=" | ").tolist()
+    embs = model.encode(texts, batch_size=settings.embedding_batch_size, show_progress_bar=True, normalize_embeddings=True, convert_to_numpy=True)
+    embs = np.ascontiguousarray(embs, dtype=np.float32)  # no copy unless encode returned another dtype
+    idx = build_faiss_index(embs)
     os.makedirs(out_dir, exist_ok=True)
+    for stale in (HNSW_SOURCE, HNSW_SIBLING):  # built from the previous vectors
+        if os.path.exists(os.path.join(out_dir, stale)): os.remove(os.path.join(out_dir, stale))
     faiss.write_index(idx, os.path.join(out_dir, "products.index"))
+    np.save(os.path.join(out_dir, "embeddings.f16.npy"), embs.astype(np.float16))  # half-size copy for index rebuilds
     with open(os.path.join(out_dir, "meta.json"), "w") as f:
         json.dump({"mapping": df[["product_id","name"]].to_dict(orient="records")}, f)
     print(f"Built index: {len(texts)} vectors → {out_dir}")
 
 def main():
-    df = pd.read_csv(settings.data_csv)
-    build_vector_index(df, settings.index_dir)
+    build_vector_index(load_products(), settings.index_dir)
 
 if __name__ == "__main__":
     main()
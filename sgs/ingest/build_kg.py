@@ -1,28 +1,82 @@
-import pandas as pd, networkx as nx, os, pickle
+import pandas as pd, networkx as nx, numpy as np, os
 from sgs.config import settings
+from sgs.ingest.products import load_products
+
+PRODUCT_COLS = ["name", "brand", "category", "sub_category", "price"]
+PRODUCT_FIELDS = ["brand", "category", "sub_category"]
+
+def _tokens(s: pd.Series, sep: str) -> pd.Series:
+    """Lowercased, stripped, non-empty tokens of a delimited column, exploded to one per row and indexed by row position."""
+    toks = s.reset_index(drop=True).fillna("").str.lower().str.split(sep).explode().str.strip()
+    return toks[toks != ""]
 
 def build_graph(df: pd.DataFrame) -> nx.Graph:
     G = nx.Graph()
-    for _, r in df.iterrows():
-        pid = f"product:{r.product_id}"
-        G.add_node(pid, label="Product", name=r.name, brand=r.brand, category=r.category, sub_category=r.sub_category, price=float(r.price))
-        b = f"brand:{r.brand}"; c = f"category:{r.category}"; sc = f"subcat:{r.sub_category}"
-        G.add_node(b, label="Brand", name=r.brand); G.add_node(c, label="Category", name=r.category); G.add_node(sc, label="SubCategory", name=r.sub_category)
-        G.add_edge(pid, b, type="MADE_BY"); G.add_edge(pid, sc, type="IN_SUBCATEGORY"); G.add_edge(sc, c, type="IN_CATEGORY")
-        for ing in str(r.ingredients).split(","):
-            ing = ing.strip().lower();  n = f"ing:{ing}"
-            if ing: G.add_node(n, label="Ingredient", name=ing); G.add_edge(pid, n, type="HAS_INGREDIENT")
-        for att in str(r.attributes).split(";"):
-            att = att.strip().lower();  n = f"attr:{att}"
-            if att: G.add_node(n, label="Attribute", name=att); G.add_edge(pid, n, type="HAS_ATTRIBUTE")
+    # Split/clean ingredient and attribute lists once in pandas
+    ings = _tokens(df["ingredients"], ",")
+    atts = _tokens(df["attributes"], ";")
+
+    # Shared nodes (brands, categories, ingredients, ...) repeat across products: add each one once
+    G.add_nodes_from((f"brand:{b}", {"label": "Brand", "name": b}) for b in df["brand"].unique())
+    G.add_nodes_from((f"category:{c}", {"label": "Category", "name": c}) for c in df["category"].unique())
+    G.add_nodes_from((f"subcat:{sc}", {"label": "SubCategory", "name": sc}) for sc in df["sub_category"].unique())
+    G.add_nodes_from((f"ing:{i}", {"label": "Ingredient", "name": i}) for i in ings.unique())
+    G.add_nodes_from((f"attr:{a}", {"label": "Attribute", "name": a}) for a in atts.unique())
+    subs = df[["category", "sub_category"]].drop_duplicates()
+    G.add_edges_from((f"subcat:{sc}", f"category:{c}", {"type": "IN_CATEGORY"}) for c, sc in zip(subs["category"], subs["sub_category"]))
+
+    pids = [f"product:{p}" for p in df["product_id"].to_numpy()]
+    nodes: list[tuple[str, dict]] = []
+    edges: list[tuple[str, str, dict]] = []
+    for pid, name, brand, cat, sub, price in zip(pids, *(df[c].to_numpy() for c in PRODUCT_COLS)):
+        nodes.append((pid, {"label": "Product", "name": name, "brand": brand, "category": cat, "sub_category": sub, "price": float(price)}))
+        edges += [(pid, f"brand:{brand}", {"type": "MADE_BY"}), (pid, f"subcat:{sub}", {"type": "IN_SUBCATEGORY"})]
+    G.add_nodes_from(nodes)
+    G.add_edges_from(edges)
+
+    # Ingredient/attribute edges come straight from the exploded token columns (index = row position)
+    G.add_edges_from((pids[i], f"ing:{ing}", {"type": "HAS_INGREDIENT"}) for i, ing in zip(ings.index, ings))
+    G.add_edges_from((pids[i], f"attr:{att}", {"type": "HAS_ATTRIBUTE"}) for i, att in zip(atts.index, atts))
+    return G
+
+def save_graph_columns(G: nx.Graph, path: str):
+    """Write G as flat node/edge columns (.npz of plain str/float/int arrays): no per-object unpickling on load."""
+    nodes = list(G)
+    index = {n: i for i, n in enumerate(nodes)}
+    data = [G.nodes[n] for n in nodes]
+    cols = {f: np.array([str(d.get(f, "")) for d in data]) for f in ["label", "name"] + PRODUCT_FIELDS}
+    with open(path, "wb") as f:  # a file object, so np.savez doesn't append ".npz" to a path without it
+        np.savez(
+            f,
+            id=np.array(nodes),
+            price=np.array([float(d.get("price", "nan")) for d in data]),
+            src=np.fromiter((index[u] for u, _ in G.edges()), dtype=np.int32, count=G.number_of_edges()),
+            dst=np.fromiter((index[v] for _, v in G.edges()), dtype=np.int32, count=G.number_of_edges()),
+            type=np.array([t for _, _, t in G.edges(data="type", default="")]),
+            **cols,
+        )
+
+def load_graph_columns(path: str) -> nx.Graph:
+    """Rebuild the graph written by save_graph_columns with the bulk node/edge adders."""
+    with np.load(path) as z:
+        ids, labels, names, prices = z["id"].tolist(), z["label"].tolist(), z["name"].tolist(), z["price"].tolist()
+        fields = [z[f].tolist() for f in PRODUCT_FIELDS]
+        src, dst, types = z["src"].tolist(), z["dst"].tolist(), z["type"].tolist()
+    nodes = []
+    for n, lab, name, price, *vals in zip(ids, labels, names, prices, *fields):
+        d = {"label": lab, "name": name}
+        if lab == "Product": d |= dict(zip(PRODUCT_FIELDS, vals)) | {"price": price}
+        nodes.append((n, d))
+    G = nx.Graph()
+    G.add_nodes_from(nodes)
+    G.add_edges_from((ids[u], ids[v], {"type": t}) for u, v, t in zip(src, dst, types))
     return G
 
 def main():
-    df = pd.read_csv(settings.data_csv)
-    G = build_graph(df)
-    os.makedirs(os.path.dirname(settings.graph_path), exist_ok=True)
-    with open(settings.graph_path, "wb") as f: pickle.dump(G, f)
-    print(f"Saved graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges → {settings.graph_path}")
+    G = build_graph(load_products())
+    os.makedirs(os.path.dirname(settings.graph_columns_path), exist_ok=True)
+    save_graph_columns(G, settings.graph_columns_path)
+    print(f"Saved graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges → {settings.graph_columns_path}")
 
 if __name__ == "__main__":
     main()
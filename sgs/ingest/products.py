@@ -0,0 +1,44 @@
+import json, os
+from functools import lru_cache
+import pandas as pd
+from sgs.config import settings
+
+def _csv_source() -> dict:
+    """Identity of the source CSV: the pickled cache is only trusted while this still matches what it was written from."""
+    st = os.stat(settings.data_csv)
+    return {"path": os.path.abspath(settings.data_csv), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _source_path() -> str:
+    return settings.products_cache + ".source.json"
+
+def _cache_is_fresh() -> bool:
+    try:
+        with open(_source_path()) as f:
+            return json.load(f) == _csv_source() and os.path.exists(settings.products_cache)
+    except (OSError, ValueError):
+        return False
+
+@lru_cache(maxsize=1)
+def load_products() -> pd.DataFrame:
+    """
+    Product table in CSV row order, parsed once per process and shared by the pipeline and the vector retriever:
+    the pickle written by prepare-data while it matches DATA_CSV, else the CSV itself. Shared frame: do not mutate.
+    """
+    if _cache_is_fresh():
+        return pd.read_pickle(settings.products_cache)
+    return pd.read_csv(settings.data_csv)
+
+def save_products_cache(df: pd.DataFrame):
+    """Pickle df (typed, parse-free reload for the API) along with the identity of the CSV it came from."""
+    os.makedirs(os.path.dirname(settings.products_cache), exist_ok=True)
+    df.to_pickle(settings.products_cache)
+    with open(_source_path(), "w") as f:
+        json.dump(_csv_source(), f)
+
+def main():
+    df = load_products()
+    save_products_cache(df)
+    print(f"Cached products: {len(df)} rows → {settings.products_cache}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import re
+from typing import Callable, Dict, Iterable, Mapping
+
+
+def compile_phrase_matcher(synonyms: Mapping[str, Iterable[str]]) -> Callable[[str], set[str]]:
+    """
+    Compile synonyms (key -> phrases) into match(text) -> {key for key, phrases in synonyms.items() if any phrase
+    is a substring of text}, found in a single sweep over text. Text is matched as given (callers lowercase it).
+
+    All phrases go into one alternation. Named groups can't express the mapping (one phrase may mean several keys,
+    e.g. "no sugar" -> low_sugar and zero_sugar, and phrases sit inside each other, e.g. "protein" in "high
+    protein"): instead the lookahead reports the longest phrase starting at each position, and each phrase maps to
+    the keys of every phrase it contains. Any phrase in the text is a prefix of the longest phrase found where it
+    starts, so it's still counted, which keeps the `phrase in text` semantics.
+    """
+    phrases = sorted({p for ps in synonyms.values() for p in ps if p}, key=len, reverse=True)
+    if not phrases:
+        return lambda text: set()
+    phrase_re = re.compile("(?=(" + "|".join(map(re.escape, phrases)) + "))")
+    phrase_keys: Dict[str, frozenset[str]] = {
+        phrase: frozenset(key for key, ps in synonyms.items() if any(p and p in phrase for p in ps)) for phrase in phrases
+    }
+
+    def match(text: str) -> set[str]:
+        return {key for m in phrase_re.finditer(text) for key in phrase_keys[m.group(1)]}
+
+    return match
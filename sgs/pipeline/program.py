@@ -1,89 +1,146 @@
+import asyncio
 import json
 import re
+from functools import lru_cache
 from typing import List, Dict
 
 import dspy
 import pandas as pd
 
+from sgs.ingest.products import load_products
+from sgs.phrases import compile_phrase_matcher
 from sgs.pipeline.signatures import ProductSearchSignature, ProductAnswerSignature
 from sgs.retrievers.vector_retriever import vector_search
 from sgs.retrievers.kg_retriever import kg_search
-from sgs.config import settings
+
+
+# Most context lines any consumer reads (LLM prompts take 20, the API returns 10)
+MAX_CONTEXT = 20
+
+_BUDGET_RE = re.compile(r"\$?\s*(\d+(?:\.\d{1,2})?)")
+_BUDGET_TRIGGERS = ("under", "<", "less", "budget")
+_VEC_LINE_RE = re.compile(r"(.+?) \((.+?)\) - \$([\d.]+)")
+
+_ATTR_SYNONYMS: Dict[str, List[str]] = {
+    "nut_free": ["nut-free", "nut free", "no nuts", "peanut-free", "peanut free"],
+    "gluten_free": ["gluten-free", "gluten free"],
+    "low_sodium": ["low sodium", "less sodium"],
+    "low_sugar": ["low sugar", "no sugar", "zero sugar", "unsweetened"],
+    "high_protein": ["high protein", "protein"],
+    "vegan": ["vegan", "plant-based", "plant based"],
+    "vegetarian": ["vegetarian"],
+    "caffeinated": ["caffeinated", "with caffeine"],
+    "zero_sugar": ["zero sugar", "no sugar", "unsweetened"],
+}
+# Attributes the search program hard-filters on
+_FILTER_ATTRS = ("nut_free", "gluten_free", "low_sodium", "low_sugar", "high_protein", "vegan", "vegetarian", "zero_sugar")
+
+_match_attrs = compile_phrase_matcher(_ATTR_SYNONYMS)
 
 
 def _parse_budget(query: str) -> float | None:
     """Extract a budget like 'under $5', '<= $4.50', 'under 3 bucks'."""
     q = query.lower()
-    m = re.search(r"\$?\s*(\d+(?:\.\d{1,2})?)", q)
+    m = _BUDGET_RE.search(q)
     if not m:
         return None
     amt = float(m.group(1))
-    if "under" in q or "<" in q or "less" in q or "budget" in q:
+    if any(t in q for t in _BUDGET_TRIGGERS):
         return amt
     return None
 
-def _want_attr(query: str, attr_key: str) -> bool:
-    q = query.lower()
-    synonyms = {
-        "nut_free": ["nut-free", "nut free", "no nuts", "peanut-free", "peanut free"],
-        "gluten_free": ["gluten-free", "gluten free"],
-        "low_sodium": ["low sodium", "less sodium"],
-        "low_sugar": ["low sugar", "no sugar", "zero sugar", "unsweetened"],
-        "high_protein": ["high protein", "protein"],
-        "vegan": ["vegan", "plant-based", "plant based"],
-        "vegetarian": ["vegetarian"],
-        "caffeinated": ["caffeinated", "with caffeine"],
-        "zero_sugar": ["zero sugar", "no sugar", "unsweetened"],
-    }
-    for phrase in synonyms.get(attr_key, []):
-        if phrase in q:
-            return True
-    return False
+def _wanted_attrs(query: str) -> set[str]:
+    """Every attribute whose synonym phrases appear in the query."""
+    return _match_attrs(query.lower())
+
+
+@lru_cache(maxsize=1)
+def _product_lookups() -> tuple[pd.DataFrame, Dict[int, Dict], Dict[str, Dict], Dict[int, frozenset]]:
+    """
+    Load the product table once per process and key it for O(1) request-time lookups:
+    (df, product_id -> info, lowercased name -> info, product_id -> normalized attribute tokens).
+    """
+    df = load_products().set_index("product_id")
+    by_id: Dict[int, Dict] = {}
+    by_name: Dict[str, Dict] = {}
+    attr_sets: Dict[int, frozenset] = {}
+    attrs = df["attributes"].fillna("").str.lower()  # lowercased once here, not per request
+    for r, attr in zip(df.itertuples(), attrs):
+        info = {
+            "product_id": int(r.Index),
+            "product": str(r.name),
+            "brand": str(r.brand),
+            "price": float(r.price),
+            "category": str(r.category),
+            "sub_category": str(r.sub_category),
+            "attributes": attr,
+        }
+        by_id.setdefault(info["product_id"], info)
+        attr_sets.setdefault(info["product_id"], frozenset(filter(None, map(str.strip, attr.split(";")))))
+        by_name.setdefault(info["product"].lower(), info)
+    return df, by_id, by_name, attr_sets
+
+
+def _llm_suggestions(pred, top: List[Dict]) -> List[Dict]:
+    """The LM's suggestions if it returned a non-empty JSON list; otherwise our own top list."""
+    if getattr(pred, "suggestions", None):
+        try:
+            llm_suggestions = json.loads(pred.suggestions)
+            if isinstance(llm_suggestions, list) and llm_suggestions:
+                return llm_suggestions
+        except Exception:
+            pass
+    return top
 
 
 class HybridSearchProgram(dspy.Module):
     def __init__(self):
         super().__init__()
         self.search_llm = dspy.Predict(ProductSearchSignature)
-        # Load product table once (for nice names/attrs/price)
-        self.df = pd.read_csv(settings.data_csv)
+        # Product table and lookups are process-wide singletons (for nice names/attrs/price)
+        self.df, self._by_id, self._by_name, self._attr_sets = _product_lookups()
 
     def _enrich_from_df(self, product_id: int | str | None = None, name: str | None = None) -> Dict:
+        """Product info by id, else by case-insensitive name; {} if unknown. Shared dict: do not mutate."""
         if product_id is not None:
             try:
-                pid = int(str(product_id))
-                row = self.df[self.df["product_id"] == pid].iloc[0]
-                return {
-                    "product_id": int(row["product_id"]),
-                    "product": str(row["name"]),          # <-- FIX: use column, not row.name
-                    "brand": str(row["brand"]),
-                    "price": float(row["price"]),
-                    "category": str(row["category"]),
-                    "sub_category": str(row["sub_category"]),
-                    "attributes": str(row.get("attributes", "") or ""),
-                }
-            except Exception:
+                info = self._by_id.get(int(str(product_id)))
+                if info:
+                    return info
+            except ValueError:
                 pass
         if name is not None:
-            hits = self.df[self.df["name"].str.lower() == str(name).lower()]
-            if len(hits):
-                row = hits.iloc[0]
-                return {
-                    "product_id": int(row["product_id"]),
-                    "product": str(row["name"]),          # <-- FIX here too
-                    "brand": str(row["brand"]),
-                    "price": float(row["price"]),
-                    "category": str(row["category"]),
-                    "sub_category": str(row["sub_category"]),
-                    "attributes": str(row.get("attributes", "") or ""),
-                }
+            return self._by_name.get(str(name).lower(), {})
         return {}
 
     def forward(self, query: str):
         vec = vector_search(query, k=8)
         kg = kg_search(query, k=12)
+        top, ctx = self._rank(query, vec, kg)
 
-        # Build unified context and candidate list
+        # Try DSPy; if LM configured, we’ll let it rewrite suggestions.
+        try:
+            pred = self.search_llm(query=query, hybrid_context=ctx)
+        except Exception:
+            pred = None
+        return _llm_suggestions(pred, top), ctx
+
+    async def aforward(self, query: str):
+        # The retrievers are independent (embedding + FAISS vs. graph walk): overlap them on worker threads
+        vec, kg = await asyncio.gather(
+            asyncio.to_thread(vector_search, query, 8),
+            asyncio.to_thread(kg_search, query, 12),
+        )
+        top, ctx = self._rank(query, vec, kg)
+        try:
+            pred = await self.search_llm.acall(query=query, hybrid_context=ctx)
+        except Exception:
+            pred = None
+        return _llm_suggestions(pred, top), ctx
+
+    def _rank(self, query: str, vec: List[Dict], kg: List[Dict]) -> tuple[List[Dict], List[str]]:
+        """Merge vector and KG hits into (top-5 suggestions, context lines), applying budget/attribute filters."""
+        # Build unified context (first MAX_CONTEXT lines only) and candidate list
         ctx: List[str] = []
         candidates: Dict[str, Dict] = {}  # key by normalized product name
 
@@ -92,8 +149,9 @@ class HybridSearchProgram(dspy.Module):
             if item.get("type") != "text":
                 continue
             text = item["text"]
-            ctx.append(text)
-            m = re.match(r"(.+?) \((.+?)\) - \$([\d.]+)", text)
+            if len(ctx) < MAX_CONTEXT:
+                ctx.append(text)
+            m = _VEC_LINE_RE.match(text)
             if m:
                 name, brand, price = m.group(1).strip(), m.group(2).strip(), float(m.group(3))
                 key = name.lower()
@@ -105,12 +163,14 @@ class HybridSearchProgram(dspy.Module):
         for item in kg:
             t = item.get("type")
             if t == "graph_fact":
-                ctx.append(item["text"])
+                if len(ctx) < MAX_CONTEXT:
+                    ctx.append(item["text"])
             elif t == "product":
                 p = item["payload"]
-                # p has product_id, name, brand, price, etc.
-                info = self._enrich_from_df(product_id=p.get("product_id")) or {
-                    "product_id": int(str(p.get("product_id"))),
+                # p has product_id (None for graphs without ids: look those up by name), name, brand, price, etc.
+                pid = p.get("product_id")
+                info = self._enrich_from_df(product_id=pid, name=p.get("name") if pid is None else None) or {
+                    "product_id": pid,
                     "product": p.get("name"),
                     "brand": p.get("brand"),
                     "price": float(p.get("price", 0.0)),
@@ -118,19 +178,18 @@ class HybridSearchProgram(dspy.Module):
                     "sub_category": p.get("sub_category"),
                     "attributes": "",
                 }
-                ctx.append(
-                    f"PRODUCT: {info['product']} | brand={info['brand']} | "
-                    f"cat={info['category']}/{info['sub_category']} | price=${info['price']:.2f}"
-                )
+                if len(ctx) < MAX_CONTEXT:
+                    ctx.append(
+                        f"PRODUCT: {info['product']} | brand={info['brand']} | "
+                        f"cat={info['category']}/{info['sub_category']} | price=${info['price']:.2f}"
+                    )
                 prod_name = str(info.get("product", "")).strip()
                 if prod_name:
                     candidates.setdefault(prod_name.lower(), {**info, "source": "kg"})
 
         # Lightweight constraint handling
         budget = _parse_budget(query)
-        want_attrs = [a for a in ["nut_free", "gluten_free", "low_sodium", "low_sugar",
-                                  "high_protein", "vegan", "vegetarian", "zero_sugar"]
-                      if _want_attr(query, a)]
+        required = _wanted_attrs(query).intersection(_FILTER_ATTRS)
 
         def _score(c: Dict) -> tuple:
             # Prefer KG matches, then lower price, then vector score if present
@@ -141,8 +200,9 @@ class HybridSearchProgram(dspy.Module):
         filtered = list(candidates.values())
         if budget is not None:
             filtered = [c for c in filtered if c.get("price", 9999) <= budget]
-        for attr in want_attrs:
-            filtered = [c for c in filtered if attr in (c.get("attributes", "") or "").lower()]
+        if required:
+            no_attrs = frozenset()
+            filtered = [c for c in filtered if required <= self._attr_sets.get(c.get("product_id"), no_attrs)]
 
         filtered.sort(key=_score)
         top = [
@@ -157,23 +217,6 @@ class HybridSearchProgram(dspy.Module):
             }
             for c in filtered[:5]
         ]
-
-        # Try DSPy; if LM configured, we’ll let it rewrite suggestions.
-        try:
-            pred = dspy.Predict(ProductSearchSignature)(
-                query=query, hybrid_context=ctx[:20]
-            )
-            if getattr(pred, "suggestions", None):
-                # If it returns valid JSON, use it; otherwise keep our top list.
-                try:
-                    llm_suggestions = json.loads(pred.suggestions)
-                    if isinstance(llm_suggestions, list) and llm_suggestions:
-                        top = llm_suggestions
-                except Exception:
-                    pass
-        except Exception:
-            pass
-
         return top, ctx
 
 class QAProgram(dspy.Module):
@@ -183,10 +226,19 @@ class QAProgram(dspy.Module):
 
     def forward(self, query: str, contexts: List[str]):
         try:
-            return self.answer_llm(query=query, contexts=contexts[:20]).answer
+            return self.answer_llm(query=query, contexts=contexts[:MAX_CONTEXT]).answer
+        except Exception:
+            return _fallback_answer(contexts)
+
+    async def aforward(self, query: str, contexts: List[str]):
+        try:
+            return (await self.answer_llm.acall(query=query, contexts=contexts[:MAX_CONTEXT])).answer
         except Exception:
-            bullets = "\n- ".join(contexts[:5]) if contexts else "No context."
-            return f"Suggested options based on retrieved context:\n- {bullets}"
+            return _fallback_answer(contexts)
+
+def _fallback_answer(contexts: List[str]) -> str:
+    bullets = "\n- ".join(contexts[:5]) if contexts else "No context."
+    return f"Suggested options based on retrieved context:\n- {bullets}"
 
 class GroceryRAG(dspy.Module):
     def __init__(self):
@@ -201,3 +253,11 @@ class GroceryRAG(dspy.Module):
         suggestions, ctx = self.hybrid_prog(query)
         answer = self.qa(query, ctx)
         return {"suggestions": suggestions, "answer": answer, "contexts": ctx[:10]}
+
+    async def asearch(self, query: str):
+        return await self.hybrid_prog.acall(query)
+
+    async def aforward(self, query: str):
+        suggestions, ctx = await self.hybrid_prog.acall(query)
+        answer = await self.qa.acall(query, ctx)
+        return {"suggestions": suggestions, "answer": answer, "contexts": ctx[:10]}
@@ -1,35 +1,241 @@
+import json
+import os
 import pickle
 import re
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass, fields
 from functools import lru_cache
-from typing import List, Dict, Tuple
+from typing import List, Dict
 
 import networkx as nx
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # optional: _score_and_topk falls back to NumPy with identical rankings
+    numba = None
 
 from sgs.config import settings
+from sgs.phrases import compile_phrase_matcher
+from sgs.ingest.build_kg import load_graph_columns
 
 
 # -------- Helpers --------
 
+@dataclass(frozen=True)
+class CSRGraph:
+    """
+    Compressed sparse row view of the KG. Node i's neighbors are indices[indptr[i]:indptr[i+1]], and
+    edge_types[j] is the type code of the edge to indices[j]; walking it touches flat arrays, not dict-of-dicts.
+    Node attributes are stored column-wise (structure of arrays), indexed by node index. Labels and edge types are
+    interned to small integer codes (label_names[code], edge_type_names[code]), so label checks are int compares.
+    """
+    nodes: list[str]             # node ids; list position is the node index
+    index: dict[str, int]        # node id -> node index
+    indptr: np.ndarray           # int64[V + 1]
+    indices: np.ndarray          # int32[2E] neighbor node indices
+    edge_types: np.ndarray       # uint8[2E] edge type codes, parallel to indices
+    edge_type_names: list[str]   # edge type code -> 'type'
+    label: np.ndarray            # uint8[V] node label codes
+    label_names: list[str]       # label code -> 'label'
+    name: np.ndarray             # object[V] raw node names
+    brand: np.ndarray            # object[V], None off products
+    category: np.ndarray         # object[V], None off products
+    sub_category: np.ndarray     # object[V], None off products
+    price: np.ndarray            # float64[V], 0.0 off products
+    product_ids: np.ndarray      # int64[V] product_id parsed from "product:<id>", -1 off products
+    degree: np.ndarray           # int64[V]
+    attributes: np.ndarray       # object[V] sorted ';'-joined attribute neighbor names, "" off products
+    facets: np.ndarray           # str[V] "name brand category sub_category" (normalized), "" off products
+
+    def label_code(self, label: str) -> int:
+        """Code of label, or -1 (matches no node) if no node has it."""
+        return self.label_names.index(label) if label in self.label_names else -1
+
+def _column(data: list[dict], key: str) -> np.ndarray:
+    col = np.empty(len(data), dtype=object)
+    col[:] = [d.get(key) for d in data]
+    return col
+
+def _intern(values: list[str]) -> tuple[np.ndarray, list[str]]:
+    """Small-int codes for values (sorted distinct values -> 0, 1, ...), plus the code -> value table."""
+    names, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return codes.astype(np.min_scalar_type(max(len(names) - 1, 0))), names.tolist()
+
+def _to_csr(G: nx.Graph) -> CSRGraph:
+    nodes = list(G)
+    index = {n: i for i, n in enumerate(nodes)}
+    adj = G.adj
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum([len(adj[n]) for n in nodes], out=indptr[1:])
+    indices = np.fromiter((index[m] for n in nodes for m in adj[n]), dtype=np.int32, count=int(indptr[-1]))
+    edge_types, edge_type_names = _intern([d.get("type", "") for n in nodes for d in adj[n].values()])
+    data = [G.nodes[n] for n in nodes]
+    label, label_names = _intern([d.get("label", "") for d in data])
+    code = {lab: i for i, lab in enumerate(label_names)}
+    name = _column(data, "name")
+    brand, category, sub_category = _column(data, "brand"), _column(data, "category"), _column(data, "sub_category")
+    attributes = np.full(len(nodes), "", dtype=object)
+    facets = [""] * len(nodes)
+    product_ids = np.full(len(nodes), -1, dtype=np.int64)
+    for p in np.flatnonzero(label == code.get("Product", -1)).tolist():
+        nbrs = indices[indptr[p]:indptr[p + 1]]
+        attributes[p] = ";".join(sorted({_norm(a) for a in name[nbrs[label[nbrs] == code.get("Attribute", -1)]]}))
+        facets[p] = " ".join([_norm(name[p]), _norm(brand[p]), _norm(category[p]), _norm(sub_category[p])])
+        if ":" in str(nodes[p]):
+            product_ids[p] = int(str(nodes[p]).split(":", 1)[1])
+    return CSRGraph(
+        nodes, index, indptr, indices, edge_types, edge_type_names, label, label_names,
+        name=name,
+        brand=brand,
+        category=category,
+        sub_category=sub_category,
+        price=np.array([float(d.get("price") or 0.0) for d in data]),
+        product_ids=product_ids,
+        degree=np.diff(indptr),
+        attributes=attributes,
+        facets=np.array(facets, dtype=str),
+    )
+
 @lru_cache(maxsize=1)
 def _load_graph() -> nx.Graph:
-    """Load and cache the KG once per process."""
-    with open(settings.graph_path, "rb") as f:
+    """Load and cache the KG once per process (columnar artifact, else the legacy pickle)."""
+    if os.path.exists(settings.graph_columns_path):
+        return load_graph_columns(settings.graph_columns_path)
+    with open(settings.graph_path, "rb", buffering=8 * 1024 * 1024) as f:  # few large reads, not 8 KiB ones
         return pickle.load(f)
 
+# Bump when CSRGraph's fields or how _to_csr derives them change, so existing sidecars are rebuilt
+_CSR_FORMAT = 3
+
+def _graph_source() -> dict:
+    """Identity of the graph artifact _load_graph would read, used to tell whether the CSR sidecar is current."""
+    path = settings.graph_columns_path if os.path.exists(settings.graph_columns_path) else settings.graph_path
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns, "format": _CSR_FORMAT}
+
+def _save_csr(csr: CSRGraph, path: str, source: dict):
+    """Write csr as one .npy per field (plus the source it was built from), replacing any previous sidecar."""
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    # Unique per writer (threads share a pid); removed on every path, including losing a race to another writer
+    tmp = tempfile.mkdtemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=parent)
+    try:
+        for f in fields(CSRGraph):
+            if f.name != "index":  # rebuilt from nodes on load
+                np.save(os.path.join(tmp, f"{f.name}.npy"), np.asarray(getattr(csr, f.name)), allow_pickle=True)
+        with open(os.path.join(tmp, "source.json"), "w") as fh:
+            json.dump(source, fh)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def _read_csr(path: str) -> CSRGraph:
+    """Load a sidecar written by _save_csr: numeric/fixed-width columns are memory-mapped, object columns unpickled."""
+    cols = {}
+    for f in fields(CSRGraph):
+        if f.name == "index":
+            continue
+        fp = os.path.join(path, f"{f.name}.npy")
+        try:
+            cols[f.name] = np.load(fp, mmap_mode="r")
+        except ValueError:  # Python-object columns can't be mapped
+            cols[f.name] = np.load(fp, allow_pickle=True)
+    for f in ("nodes", "edge_type_names", "label_names"):
+        cols[f] = cols[f].tolist()
+    return CSRGraph(index={n: i for i, n in enumerate(cols["nodes"])}, **cols)
+
+@lru_cache(maxsize=1)
+def _load_csr() -> CSRGraph:
+    """
+    CSR form of the KG, once per process. It's read straight from the prepared sidecar (settings.graph_csr_dir)
+    while that was built from the current graph artifact; otherwise built from the graph and the sidecar rewritten.
+    """
+    path, source = settings.graph_csr_dir, _graph_source()
+    try:
+        with open(os.path.join(path, "source.json")) as fh:
+            if json.load(fh) == source:
+                return _read_csr(path)
+    except (OSError, ValueError):
+        pass
+    csr = _to_csr(_load_graph())
+    try:
+        _save_csr(csr, path, source)
+    except OSError:  # read-only artifacts: rebuild per process
+        pass
+    return csr
+
+# Neighborhood expansion bounds: hits expanded per query, neighbors walked per hit, and the degree above which
+# a hub (e.g. a popular attribute) is only expanded while no products have been found
+MAX_HITS = 50
+NEIGHBOR_CAP = 64
+HUB_DEGREE = 5000
+# Graph fact lines returned per query
+MAX_FACTS = 50
+
+@lru_cache(maxsize=100_000)
 def _norm(s: str | None) -> str:
+    # Cached: node names/brands repeat across hits and queries
     return str(s or "").strip().lower()
 
-def _parse_budget(query: str) -> float | None:
+_GRAM = 3
+
+_NO_NODES = np.empty(0, dtype=np.int32)
+
+@dataclass(frozen=True)
+class NameIndex:
+    """
+    Lowercased node names (by node index) plus n-gram postings for n <= _GRAM: gram -> sorted int32 indices of the
+    nodes whose name contains it. Substring lookups become dict hits instead of a scan over every node name.
+    """
+    names: list[str]
+    postings: dict[str, np.ndarray]
+
+    def lookup(self, token: str) -> np.ndarray:
+        """Sorted indices of nodes whose name contains token (same result as `token in name` over all names)."""
+        if len(token) <= _GRAM:
+            return self.postings.get(token, _NO_NODES)
+        # Every trigram of the token must occur in the name; verify the (few) survivors for true containment
+        grams = sorted((self.postings.get(token[i:i + _GRAM], _NO_NODES) for i in range(len(token) - _GRAM + 1)), key=len)
+        found = grams[0]
+        for g in grams[1:]:
+            found = np.intersect1d(found, g, assume_unique=True)
+        return found[np.fromiter((token in self.names[i] for i in found.tolist()), dtype=bool, count=len(found))]
+
+def _build_name_index(names: list[str]) -> NameIndex:
+    postings: dict[str, list[int]] = {}
+    for i, name in enumerate(names):
+        grams = {name[j:j + n] for n in range(1, _GRAM + 1) for j in range(len(name) - n + 1)}
+        for g in grams:
+            postings.setdefault(g, []).append(i)
+    return NameIndex(names, {g: np.array(ps, dtype=np.int32) for g, ps in postings.items()})
+
+@lru_cache(maxsize=1)
+def _load_name_index() -> NameIndex:
+    """Name index over the cached CSR nodes, built in one pass per process."""
+    return _build_name_index([_norm(n) for n in _load_csr().name])
+
+_BUDGET_RE = re.compile(r"\$?\s*(\d+(?:\.\d{1,2})?)")
+_BUDGET_TRIGGER_RE = re.compile("under|<|less|budget|max|≤")  # "<=" is covered by "<"
+_TOKEN_RE = re.compile(r"[a-z0-9%]+")
+# Light stoplist to reduce noisy matches
+_STOPWORDS = frozenset({"the", "a", "an", "and", "or", "with", "for", "to", "of", "in", "on", "under", "less"})
+
+# The query helpers below take the already-lowercased query (kg_search lowercases it once)
+
+def _parse_budget(q_lc: str) -> float | None:
     """
     Extract a budget like 'under $5', '<= 4.50', 'under 3 bucks'.
     Returns a float if we see 'under/</less/budget' context; else None.
     """
-    q = query.lower()
-    m = re.search(r"\$?\s*(\d+(?:\.\d{1,2})?)", q)
+    m = _BUDGET_RE.search(q_lc)
     if not m:
         return None
     amt = float(m.group(1))
-    if any(tok in q for tok in ("under", "<", "less", "budget", "max", "≤", "<=")):
+    if _BUDGET_TRIGGER_RE.search(q_lc):
         return amt
     return None
 
@@ -46,161 +252,257 @@ ATTR_SYNONYMS: dict[str, list[str]] = {
     "kids": ["kids", "for kids", "kid"],
 }
 
-def _wanted_attrs(query: str) -> set[str]:
-    q = query.lower()
-    wants = set()
-    for attr, phrases in ATTR_SYNONYMS.items():
-        if any(p in q for p in phrases):
-            wants.add(attr)
-    return wants
+# Canonical attributes whose synonym phrases occur in the (lowercased) query, in one sweep
+_wanted_attrs = compile_phrase_matcher(ATTR_SYNONYMS)
+
+# One bit per canonical attribute, so "has all wanted attributes" is an AND over uint64 codes
+ATTR_BITS: dict[str, int] = {attr: 1 << i for i, attr in enumerate(ATTR_SYNONYMS)}
 
-def _tokenize(query: str) -> list[str]:
-    toks = re.findall(r"[a-z0-9%]+", query.lower())
-    # Light stoplist to reduce noisy matches
-    stop = {"the", "a", "an", "and", "or", "with", "for", "to", "of", "in", "on", "under", "less"}
-    return [t for t in toks if t not in stop]
+@lru_cache(maxsize=1)
+def _load_attr_bits() -> np.ndarray:
+    """uint64[V] canonical-attribute bitmask per node (bit set if the attribute occurs in the node's attribute string)."""
+    attributes = _load_csr().attributes
+    bits = np.zeros(len(attributes), dtype=np.uint64)
+    for attr, bit in ATTR_BITS.items():
+        bits[np.char.find(attributes.astype(str), attr) >= 0] |= np.uint64(bit)
+    return bits
+
+def _tokenize(q_lc: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(q_lc) if t not in _STOPWORDS]
+
+@lru_cache(maxsize=1)
+def _load_facet_postings() -> dict[str, np.ndarray]:
+    """Word -> sorted product node indices whose facets (name, brand, category, sub_category) contain that word."""
+    postings: dict[str, list[int]] = {}
+    for p, facets in enumerate(_load_csr().facets.tolist()):
+        for w in set(_TOKEN_RE.findall(facets)):
+            postings.setdefault(w, []).append(p)
+    return {w: np.array(ps, dtype=np.int64) for w, ps in postings.items()}
+
+def _score_and_topk_numpy(prices, attr_bits, hit_counts, wanted_bits, n_wanted, budget, k):
+    """
+    Score candidate products and pick the k best: +1 per wanted attribute present (-0.25 per missing), +/-0.75
+    for being within/over budget (NaN = no budget), +0.2 per token hit (max 0.8), and a small low-price bonus.
+    Returns (candidate positions, scores), by score desc with ties in candidate order.
+    """
+    have = np.bitwise_count(attr_bits & wanted_bits).astype(np.float64)
+    scores = have - 0.25 * (n_wanted - have)
+    if not np.isnan(budget):
+        scores += np.where(prices <= budget, 0.75, -0.75)
+    scores += np.minimum(hit_counts * 0.2, 0.8)
+    scores += np.maximum(0.0, 5.0 - prices) * 0.05
+    top = np.argsort(-scores, kind="stable")[:k]
+    return top, scores[top]
+
+# Candidate sets smaller than this are scored single-threaded: waking the thread pool costs more than it saves
+PARALLEL_MIN_CANDIDATES = 1024
+PARALLEL_CHUNK = 256  # candidates per parallel work item (each keeps its own k-slot buffer)
+
+if numba is not None:
+    # Explicit signature: compiled (and cached) at import, never per call, and never in object mode
+    _SCORE_SIG = "Tuple((int64[:], float64[:]))(float64[:], uint64[:], int64[:], uint64, int64, float64, int64)"
+
+    @numba.njit(inline="always")
+    def _score_one(price, bits, hits, wanted_bits, n_wanted, budget):
+        bits &= wanted_bits
+        have = 0
+        while bits:
+            bits &= bits - np.uint64(1)
+            have += 1
+        score = have - 0.25 * (n_wanted - have)
+        if not np.isnan(budget):
+            score += 0.75 if price <= budget else -0.75
+        score += min(hits * 0.2, 0.8)
+        score += max(0.0, 5.0 - price) * 0.05
+        return score
+
+    @numba.njit(inline="always")
+    def _push_topk(top_idx, top_sc, m, i, score):
+        # Insert (i, score) into the sorted buffer holding m entries (equal scores stay in insertion order);
+        # returns the new entry count
+        k = top_idx.shape[0]
+        if k == 0 or (m == k and score <= top_sc[k - 1]):
+            return m
+        j = m if m < k else k - 1
+        while j > 0 and top_sc[j - 1] < score:
+            top_sc[j] = top_sc[j - 1]
+            top_idx[j] = top_idx[j - 1]
+            j -= 1
+        top_sc[j] = score
+        top_idx[j] = i
+        return m + 1 if m < k else m
+
+    @numba.njit(_SCORE_SIG, cache=True)
+    def _score_and_topk_serial(prices, attr_bits, hit_counts, wanted_bits, n_wanted, budget, k):
+        """Compiled _score_and_topk_numpy: one pass over the candidates into a k-slot buffer, no full sort."""
+        n = prices.shape[0]
+        k = max(min(k, n), 0)
+        top_idx = np.empty(k, np.int64)
+        top_sc = np.empty(k, np.float64)
+        m = 0
+        for i in range(n):
+            m = _push_topk(top_idx, top_sc, m, i, _score_one(prices[i], attr_bits[i], hit_counts[i], wanted_bits, n_wanted, budget))
+        return top_idx[:m], top_sc[:m]
+
+    @numba.njit(_SCORE_SIG, cache=True, parallel=True)
+    def _score_and_topk_parallel(prices, attr_bits, hit_counts, wanted_bits, n_wanted, budget, k):
+        """
+        _score_and_topk_serial over contiguous chunks in parallel, each into its own k-slot buffer; the buffers are
+        merged in chunk order, which keeps ties in candidate order.
+        """
+        n = prices.shape[0]
+        k = max(min(k, n), 0)
+        size = PARALLEL_CHUNK
+        n_chunks = (n + size - 1) // size
+        chunk_idx = np.empty((n_chunks, k), np.int64)
+        chunk_sc = np.empty((n_chunks, k), np.float64)
+        chunk_m = np.zeros(n_chunks, np.int64)
+        for c in numba.prange(n_chunks):
+            m = 0
+            for i in range(c * size, min((c + 1) * size, n)):
+                m = _push_topk(chunk_idx[c], chunk_sc[c], m, i, _score_one(prices[i], attr_bits[i], hit_counts[i], wanted_bits, n_wanted, budget))
+            chunk_m[c] = m
+        top_idx = np.empty(k, np.int64)
+        top_sc = np.empty(k, np.float64)
+        m = 0
+        for c in range(n_chunks):
+            for r in range(chunk_m[c]):
+                m = _push_topk(top_idx, top_sc, m, chunk_idx[c, r], chunk_sc[c, r])
+        return top_idx[:m], top_sc[:m]
+
+    # numba's default (workqueue) threading layer must not be entered by two threads at once, and kg_search runs
+    # in a thread pool under the API: a query that finds the parallel kernel busy scores single-threaded instead
+    _parallel_lock = threading.Lock()
+
+    def _score_and_topk(prices, attr_bits, hit_counts, wanted_bits, n_wanted, budget, k):
+        """Compiled _score_and_topk_numpy; multi-threaded for large candidate sets."""
+        args = (prices, attr_bits, hit_counts, wanted_bits, n_wanted, budget, k)
+        if len(prices) >= PARALLEL_MIN_CANDIDATES and _parallel_lock.acquire(blocking=False):
+            try:
+                return _score_and_topk_parallel(*args)
+            finally:
+                _parallel_lock.release()
+        return _score_and_topk_serial(*args)
+else:
+    _score_and_topk = _score_and_topk_numpy
 
 
 # -------- Main search --------
 
+def warm():
+    """Load the CSR graph and every table kg_search derives from it now, instead of inside the first queries."""
+    _load_name_index()
+    _load_attr_bits()
+    _load_facet_postings()
+
 def kg_search(query: str, k: int = 8) -> List[Dict]:
     """
     Lightweight KG retrieval:
-      1) Find node hits by token overlap on node 'name'
-      2) Collect neighboring Product nodes
+      1) Find node hits by token overlap on node 'name' (via the cached n-gram name index)
+      2) Collect neighboring Product nodes (degree-bounded expansion, see MAX_HITS/NEIGHBOR_CAP/HUB_DEGREE)
       3) Score products by attribute match, budget, and token matches
       4) Return compact graph facts + top-k product cards
     """
-    G = _load_graph()
+    G = _load_csr()
 
-    tokens = _tokenize(query)
-    wants = _wanted_attrs(query)
-    budget = _parse_budget(query)
+    q_lc = query.lower()
+    tokens = _tokenize(q_lc)
+    wants = _wanted_attrs(q_lc)
+    budget = _parse_budget(q_lc)
 
-    hits: set[str] = set()
-    for n, data in G.nodes(data=True):
-        name = _norm(data.get("name"))
-        if not name:
-            continue
-        if any(t in name for t in tokens):
-            hits.add(n)
+    # Nodes whose name contains any query token, as a mask over node indices
+    names = _load_name_index()
+    hits = np.zeros(len(G.nodes), dtype=bool)
+    for t in tokens:
+        hits[names.lookup(t)] = True
 
     # If query has explicit attribute words, seed hits with those attribute nodes too
     for attr in wants:
-        node_id = f"attr:{attr}"
-        if node_id in G:
-            hits.add(node_id)
-
-    # Collect candidate product nodes and context triples
-    products: set[str] = set()
-    contexts: list[str] = []
-
-    # Include direct product hits as well as neighbors-of-hits
-    for h in list(hits)[:50]:
-        h_label = G.nodes[h].get("label")
-        h_name = G.nodes[h].get("name")
-        if h_label == "Product":
-            products.add(h)
-        # One-hop neighborhood
-        for nbr in G.neighbors(h):
-            ndata = G.nodes[nbr]
-            edata = G.get_edge_data(h, nbr) or {}
-            if ndata.get("label") == "Product":
-                products.add(nbr)
-            # Compact fact line
-            contexts.append(
-                f"{h_label}({_norm(h_name)}) -[{edata.get('type', '')}]-> "
-                f"{ndata.get('label')}({_norm(ndata.get('name'))})"
-            )
-
-    # Build product cards with scoring
-    candidates: list[Tuple[float, Dict]] = []
-
-    def score_product(pnode: str) -> Tuple[float, Dict]:
-        d = G.nodes[pnode]
-        name = d.get("name")
-        brand = d.get("brand")
-        category = d.get("category")
-        subcat = d.get("sub_category")
-        price = float(d.get("price") or 0.0)
-
-        # Attributes string reconstruction from neighbors (for filtering/explain)
-        attrs = []
-        for nbr in G.neighbors(pnode):
-            if G.nodes[nbr].get("label") == "Attribute":
-                attrs.append(_norm(G.nodes[nbr].get("name")))
-        attr_str = ";".join(sorted(set(attrs)))
-
-        # Base score
-        score = 0.0
-
-        # Attribute matches: +1 each wanted attribute present, small penalty if wanted but missing
-        for a in wants:
-            if a in attr_str:
-                score += 1.0
-            else:
-                score -= 0.25
-
-        # Budget preference
-        if budget is not None:
-            if price <= budget:
-                score += 0.75
-            else:
-                score -= 0.75
-
-        # Token matches across facets
-        facets = " ".join([_norm(name), _norm(brand), _norm(category), _norm(subcat)])
-        if tokens:
-            hit_count = sum(1 for t in tokens if t in facets)
-            score += min(hit_count * 0.2, 0.8)
-
-        # Prefer lower price slightly (but don’t dominate)
-        score += max(0.0, 5.0 - price) * 0.05  # ~+0.25 if price ~0.0
-
-        card = {
-            "product_id": int(str(pnode).split(":", 1)[1]) if ":" in str(pnode) else None,
-            "name": name,
-            "brand": brand,
-            "category": category,
-            "sub_category": subcat,
-            "price": price,
-            "attributes": attr_str,
-        }
-        return score, card
-
-    for p in products:
-        try:
-            sc, card = score_product(p)
-            candidates.append((sc, card))
-        except Exception:
-            continue
-
-    # Sort by score desc, dedupe by product name, filter by explicit wants/budget
-    candidates.sort(key=lambda x: x[0], reverse=True)
-
-    seen_names = set()
-    cards: list[Dict] = []
-    for sc, c in candidates:
-        pname = _norm(c.get("name"))
-        if not pname or pname in seen_names:
+        i = G.index.get(f"attr:{attr}")
+        if i is not None:
+            hits[i] = True
+
+    # Collect candidate product nodes (as a mask over node indices) and context triples; facts are kept as
+    # (hit, edge position, neighbor) until the end, and only the first MAX_FACTS are kept at all
+    products = np.zeros(len(G.nodes), dtype=bool)
+    facts: list[tuple[int, int, int]] = []
+
+    # Hard filters (budget, every wanted attribute): only products passing them count towards the expansion budget
+    all_attr_bits = _load_attr_bits()
+    wanted_bits = np.uint64(sum(ATTR_BITS[a] for a in wants))
+
+    def passes(ix):
+        ok = (all_attr_bits[ix] & wanted_bits) == wanted_bits
+        return ok if budget is None else ok & (G.price[ix] <= budget)
+
+    # Include direct product hits as well as neighbors-of-hits: specific (product/name) hits first, attribute
+    # hubs last, lowest degree first, and stop once there are plenty of candidates to rank
+    hit_ids = np.flatnonzero(hits)
+    product = G.label_code("Product")
+    order = np.lexsort((G.degree[hit_ids], G.label[hit_ids] == G.label_code("Attribute")))
+    n_products = 0
+    for h in hit_ids[order][:MAX_HITS].tolist():
+        deg = int(G.degree[h])
+        if deg > HUB_DEGREE and n_products:
             continue
-        # Hard filters
-        if budget is not None and c.get("price", 1e9) > budget:
-            continue
-        ok = True
-        for a in wants:
-            if a not in (c.get("attributes") or ""):
-                ok = False
-                break
-        if not ok:
-            continue
-        seen_names.add(pname)
-        cards.append(c)
-        if len(cards) >= k:
+        # One-hop neighborhood, capped
+        start = int(G.indptr[h])
+        nbrs = G.indices[start:start + min(deg, NEIGHBOR_CAP)]
+        new = nbrs[(G.label[nbrs] == product) & ~products[nbrs]]
+        products[new] = True
+        n_products += int(np.count_nonzero(passes(new)))
+        room = MAX_FACTS - len(facts)
+        facts += ((h, start + j, nbr) for j, nbr in enumerate(nbrs[:room].tolist()))
+        if G.label[h] == product and not products[h]:
+            products[h] = True
+            n_products += bool(passes(h))
+        if n_products >= 4 * k:
             break
 
-    # Compact context (cap to 50 lines)
-    facts = [{"type": "graph_fact", "text": ctx} for ctx in contexts[:50]]
+    # Apply the hard filters as one mask, so only surviving products get scored
+    cand = np.flatnonzero(products)
+    cand = cand[passes(cand)]
+    attr_bits = all_attr_bits[cand]
+    # One candidate per product_id (distinct products may share a name), first in node order
+    _, first = np.unique(G.product_ids[cand], return_index=True)
+    first.sort()
+    cand, attr_bits = cand[first], attr_bits[first]
+    prices = G.price[cand]
+
+    # Token matches across facets: whole facet words, looked up in the cached word postings
+    facet_postings = _load_facet_postings()
+    hit_counts = np.zeros(len(cand), dtype=np.int64)
+    for t in tokens:
+        if t in facet_postings:
+            hit_counts += np.isin(cand, facet_postings[t], assume_unique=True)
+
+    # Score survivors and take the top k (numba kernel when available); cards are a gather over the columns
+    top, _ = _score_and_topk(prices, attr_bits, hit_counts, wanted_bits, len(wants),
+                             np.nan if budget is None else float(budget), k)
+    rows = cand[top]
+    cards: list[Dict] = [
+        {
+            "product_id": pid if pid >= 0 else None,
+            "name": G.name[p],
+            "brand": G.brand[p],
+            "category": G.category[p],
+            "sub_category": G.sub_category[p],
+            "price": price,
+            "attributes": G.attributes[p],
+        }
+        for p, pid, price in zip(rows.tolist(), G.product_ids[rows].tolist(), G.price[rows].tolist())
+    ]
+
+    # Compact fact lines, formatted only for the facts kept
+    labels = G.label_names
+    fact_payloads = [
+        {
+            "type": "graph_fact",
+            "text": f"{labels[G.label[h]]}({_norm(G.name[h])}) -[{G.edge_type_names[G.edge_types[j]]}]-> "
+                    f"{labels[G.label[n]]}({_norm(G.name[n])})",
+        }
+        for h, j, n in facts
+    ]
     product_payloads = [{"type": "product", "payload": pc} for pc in cards]
 
-    return facts + product_payloads
+    return fact_payloads + product_payloads
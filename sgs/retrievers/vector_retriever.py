@@ -1,34 +1,119 @@
-import os, json
-from typing import List, Dict
+import os, json, logging
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Dict
+import numpy as np
 import pandas as pd
-import faiss
-from sentence_transformers import SentenceTransformer
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 from sgs.config import settings
+from sgs.ingest.products import load_products
+
+logger = logging.getLogger(__name__)
+
+# Above this many vectors an exact (flat) index costs noticeably more per query than HNSW
+FLAT_INDEX_WARN_NTOTAL = 50_000
 
+@lru_cache(maxsize=1)
+def _get_model() -> "SentenceTransformer":
+    """Load and cache the query encoder once per process (sentence_transformers/torch are imported here, not at module import)."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(settings.embedding_model)
+
+@lru_cache(maxsize=1)
 def _load_index():
+    """
+    Load and cache the FAISS index and the product_id of each of its vectors (int64 array, from meta.json) once
+    per process ((None, None) if not built). A large flat products.index is swapped for a products.hnsw.index
+    sibling (same vector order, see build-hnsw) when one was built from this exact products.index.
+    """
     ip = os.path.join(settings.index_dir, "products.index")
     mp = os.path.join(settings.index_dir, "meta.json")
     if not (os.path.exists(ip) and os.path.exists(mp)):
         return None, None
-    return faiss.read_index(ip), json.load(open(mp))
+    import faiss
+    from sgs.ingest.build_index import HNSW_SIBLING, HNSW_SOURCE, index_source
+    with open(mp) as f:
+        mapping = json.load(f)["mapping"]
+    pids = np.fromiter((m["product_id"] for m in mapping), dtype=np.int64, count=len(mapping))
+    index = faiss.read_index(ip)
+    if isinstance(index, faiss.IndexFlat) and index.ntotal > FLAT_INDEX_WARN_NTOTAL:
+        hp = os.path.join(settings.index_dir, HNSW_SIBLING)
+        try:
+            with open(os.path.join(settings.index_dir, HNSW_SOURCE)) as f:
+                current = json.load(f) == index_source(settings.index_dir)
+        except (OSError, ValueError):  # no sibling, or one from before source tracking
+            current = False
+        sibling = faiss.read_index(hp) if current and os.path.exists(hp) else None
+        if sibling is not None and sibling.ntotal == index.ntotal == len(pids):
+            index = sibling
+        else:
+            logger.warning(
+                "%s is a flat (exact, O(N) per query) index over %d vectors%s; run `sgs build-hnsw` or rebuild it "
+                "with FAISS_INDEX=%s", ip, index.ntotal, f" and {hp} is stale" if os.path.exists(hp) else "",
+                settings.faiss_index,
+            )
+    return index, pids
 
-def _load_products():
-    return pd.read_csv(settings.data_csv)
+@lru_cache(maxsize=1)
+def _load_products() -> pd.DataFrame:
+    """Product table indexed by product_id (column kept, first row wins), so hits are gathered with one .loc."""
+    df = load_products().set_index("product_id", drop=False)
+    return df[~df.index.duplicated()]
 
-def vector_search(query: str, k: int = 5) -> List[Dict]:
-    index, meta = _load_index()
+@lru_cache(maxsize=1)
+def _search_text() -> tuple[np.ndarray, np.ndarray]:
+    """Lowercased name and attribute columns (str arrays) for the no-index substring fallback."""
+    df = _load_products()
+    return (
+        np.array(df["name"].fillna("").str.lower().tolist(), dtype=str),
+        np.array(df["attributes"].fillna("").str.lower().tolist(), dtype=str),
+    )
+
+def _text(r) -> str:
+    return f"{r.name} ({r.brand}) - ${r.price:.2f} | {r.category}/{r.sub_category} | attrs: {r.attributes}"
+
+def warm():
+    """Load what vector_search will touch (index + encoder, or the fallback's text columns) now, not on first use."""
+    _load_products()
+    index, _ = _load_index()
+    if index is None:
+        _search_text()
+    else:
+        _get_model()
+
+def vector_search_batch(queries: List[str], k: int = 5) -> List[List[Dict]]:
+    """
+    vector_search for many queries at once: one batched encode and one index.search for all of them, and a
+    single product-table gather for every hit.
+    """
+    index, pids = _load_index()
+    if index is None or not queries:
+        return [vector_search(q, k) for q in queries]
     df = _load_products()
+    Q = _get_model().encode(
+        queries, batch_size=settings.embedding_batch_size, convert_to_numpy=True, normalize_embeddings=True
+    ).astype("float32")
+    import faiss  # already loaded by _load_index
+    params = None
+    if isinstance(index, faiss.IndexHNSW):
+        # Per-call search params (not index.hnsw.efSearch) so concurrent searches with different k don't race
+        params = faiss.SearchParametersHNSW(efSearch=max(k * 4, settings.hnsw_ef_search))
+    scores, I = index.search(Q, k, params=params)
+    found = I >= 0  # fewer than k results are padded with -1
+    rows = df.loc[pids[I[found]]]
+    hits = iter([{"type":"text","text": _text(r), "score": sc} for r, sc in zip(rows.itertuples(), scores[found].tolist())])
+    return [[next(hits) for _ in range(n)] for n in np.count_nonzero(found, axis=1).tolist()]
+
+def vector_search(query: str, k: int = 5) -> List[Dict]:
+    index, _ = _load_index()
     if index is None:
-        mask = df["name"].str.contains(query, case=False, na=False) | df["attributes"].str.contains(query, case=False, na=False)
-        hits = df[mask].head(k)
-        return [{"type":"text","text": f"{r.name} ({r.brand}) - ${r.price:.2f} | {r.category}/{r.sub_category} | attrs: {r.attributes}"} for _, r in hits.iterrows()]
-    model = SentenceTransformer(settings.embedding_model)
-    q = model.encode([query], normalize_embeddings=True).astype("float32")
-    scores, I = index.search(q, k)
-    rows = []
-    for idx, sc in zip(I[0], scores[0]):
-        meta_row = meta["mapping"][idx]
-        r = df[df["product_id"] == meta_row["product_id"]].iloc[0]
-        rows.append({"type":"text","text": f"{r.name} ({r.brand}) - ${r.price:.2f} | {r.category}/{r.sub_category} | attrs: {r.attributes}", "score": float(sc)})
-    return rows
+        # No index built: case-insensitive literal substring match on name/attributes, in C over cached columns
+        df = _load_products()
+        name_lc, attrs_lc = _search_text()
+        q = query.lower()
+        mask = (np.char.find(name_lc, q) >= 0) | (np.char.find(attrs_lc, q) >= 0)
+        hits = df.iloc[np.flatnonzero(mask)[:k]]
+        return [{"type":"text","text": _text(r)} for r in hits.itertuples()]
+    return vector_search_batch([query], k)[0]
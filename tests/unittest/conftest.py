@@ -0,0 +1,19 @@
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def products_df() -> pd.DataFrame:
+    """Two-product catalog in the DATA_CSV layout (shared brand/category, overlapping ingredients/attributes)."""
+    return pd.DataFrame(
+        {
+            "product_id": [1, 2],
+            "name": ["Oat Granola", "Nut-Free Granola"],
+            "brand": ["H-E-B", "H-E-B"],
+            "category": ["Pantry", "Pantry"],
+            "sub_category": ["Cereal & Granola", "Cereal & Granola"],
+            "price": [4.49, 4.79],
+            "ingredients": ["Oats, Honey", "Oats,raisins"],
+            "attributes": ["vegetarian", "nut_free; vegetarian"],
+        }
+    )
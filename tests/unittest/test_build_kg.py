@@ -0,0 +1,39 @@
+from sgs.ingest.build_kg import build_graph, load_graph_columns, save_graph_columns
+
+
+def test_build_graph_nodes(products_df) -> None:
+    G = build_graph(products_df)
+    assert G.nodes["product:1"] == {
+        "label": "Product",
+        "name": "Oat Granola",
+        "brand": "H-E-B",
+        "category": "Pantry",
+        "sub_category": "Cereal & Granola",
+        "price": 4.49,
+    }
+    # Shared nodes are created once and lowercased/stripped
+    assert sorted(n for n in G if n.startswith("ing:")) == ["ing:honey", "ing:oats", "ing:raisins"]
+    assert sorted(n for n in G if n.startswith("attr:")) == ["attr:nut_free", "attr:vegetarian"]
+    assert G.nodes["brand:H-E-B"] == {"label": "Brand", "name": "H-E-B"}
+
+
+def test_build_graph_edges(products_df) -> None:
+    G = build_graph(products_df)
+    assert G.edges["product:2", "attr:nut_free"]["type"] == "HAS_ATTRIBUTE"
+    assert G.edges["product:1", "ing:oats"]["type"] == "HAS_INGREDIENT"
+    assert G.edges["product:1", "brand:H-E-B"]["type"] == "MADE_BY"
+    assert G.edges["subcat:Cereal & Granola", "category:Pantry"]["type"] == "IN_CATEGORY"
+    assert G.degree("attr:vegetarian") == 2
+
+
+def test_graph_columns_round_trip(tmp_path, products_df) -> None:
+    G = build_graph(products_df)
+    path = tmp_path / "graph.cols"  # written at exactly this path, not graph.cols.npz
+    save_graph_columns(G, str(path))
+    assert [p.name for p in tmp_path.iterdir()] == ["graph.cols"]
+    H = load_graph_columns(str(path))
+    assert list(H) == list(G)
+    assert dict(H.nodes(data=True)) == dict(G.nodes(data=True))
+    assert {frozenset((u, v)): t for u, v, t in H.edges(data="type")} == {
+        frozenset((u, v)): t for u, v, t in G.edges(data="type")
+    }
@@ -0,0 +1,146 @@
+import os
+from dataclasses import fields
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sgs.ingest.build_kg import build_graph
+from sgs.retrievers import kg_retriever
+from sgs.retrievers.kg_retriever import (
+    CSRGraph,
+    _build_name_index,
+    _read_csr,
+    _save_csr,
+    _score_and_topk,
+    _score_and_topk_numpy,
+    _to_csr,
+    kg_search,
+)
+
+
+def test_name_index_matches_substrings() -> None:
+    names = ["nut-free crunch granola", "peanut butter", "", "oats"]
+    index = _build_name_index(names)
+    for token in ["nut", "granola", "anola", "o", "oats", "butte", "crunchy", "zz"]:
+        assert index.lookup(token).tolist() == [i for i, name in enumerate(names) if name and token in name]
+
+
+def _assert_ranks_like_numpy(score_and_topk, n: int, k: int = 7) -> None:
+    rng = np.random.default_rng(n)
+    prices = rng.choice([1.5, 3.0, 4.5, 6.0], size=n)  # few distinct scores: plenty of ties
+    attr_bits = rng.integers(0, 16, size=n).astype(np.uint64)
+    hit_counts = rng.integers(0, 6, size=n).astype(np.int64)
+    for budget in (np.nan, 4.0):
+        args = (prices, attr_bits, hit_counts, np.uint64(0b101), 2, budget)
+        expected_top, expected_scores = _score_and_topk_numpy(*args, n)
+        top, scores = score_and_topk(*args, k)
+        assert top.tolist() == expected_top[:k].tolist()
+        assert np.array_equal(scores, expected_scores[:k])
+
+
+def test_score_and_topk_matches_numpy_ranking() -> None:
+    for n in (0, 3, 200, 5000):
+        _assert_ranks_like_numpy(_score_and_topk, n)
+
+
+def test_compiled_serial_kernel_matches_numpy_ranking() -> None:
+    pytest.importorskip("numba")
+    for n in (0, 3, 200, 5000):
+        _assert_ranks_like_numpy(kg_retriever._score_and_topk_serial, n)
+
+
+def test_compiled_parallel_kernel_matches_numpy_ranking() -> None:
+    pytest.importorskip("numba")
+    chunk = kg_retriever.PARALLEL_CHUNK
+    for n in (0, 3, chunk, chunk + 1, 5000):  # empty, one partial chunk, exact and ragged chunk splits
+        _assert_ranks_like_numpy(kg_retriever._score_and_topk_parallel, n)
+
+
+def test_score_and_topk_uses_parallel_kernel_only_when_free(monkeypatch) -> None:
+    pytest.importorskip("numba")
+    calls = []
+    parallel = kg_retriever._score_and_topk_parallel
+
+    def spy(*args):
+        calls.append(len(args[0]))
+        return parallel(*args)
+
+    monkeypatch.setattr(kg_retriever, "_score_and_topk_parallel", spy)
+    n = kg_retriever.PARALLEL_MIN_CANDIDATES
+    _assert_ranks_like_numpy(_score_and_topk, n - 1)
+    assert calls == []
+    _assert_ranks_like_numpy(_score_and_topk, n)
+    assert calls == [n, n]
+    # Another query holds the parallel kernel: fall back to the serial one rather than wait
+    with kg_retriever._parallel_lock:
+        _assert_ranks_like_numpy(_score_and_topk, n)
+    assert calls == [n, n]
+
+
+def test_csr_sidecar_round_trip(tmp_path, products_df) -> None:
+    csr = _to_csr(build_graph(products_df))
+    path = str(tmp_path / "graph.csr")
+    _save_csr(csr, path, {"path": "graph.npz"})
+    loaded = _read_csr(path)
+    for f in fields(CSRGraph):
+        expected, actual = getattr(csr, f.name), getattr(loaded, f.name)
+        if isinstance(expected, np.ndarray):
+            assert np.array_equal(actual, expected), f.name
+        else:
+            assert actual == expected, f.name
+
+
+def test_csr_sidecar_losing_writer_cleans_up(tmp_path, monkeypatch, products_df) -> None:
+    path = tmp_path / "graph.csr"
+    real_replace = os.replace
+
+    def replace_after_other_writer(src, dst):
+        # Another worker finishes its sidecar between our rmtree and our rename
+        os.makedirs(dst, exist_ok=True)
+        (path / "source.json").write_text("{}")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(kg_retriever.os, "replace", replace_after_other_writer)
+    csr = _to_csr(build_graph(products_df))
+    with pytest.raises(OSError):
+        kg_retriever._save_csr(csr, str(path), {"path": "graph.npz"})
+    assert os.listdir(tmp_path) == ["graph.csr"]
+
+
+@pytest.fixture
+def granola_graph(monkeypatch):
+    # 40 vegetarian "Granola N" products and 5 nut_free "Crunch Granola N": the name hits alone fill the expansion
+    # budget long before the attr:nut_free hub (expanded last) is reached
+    n = 45
+    df = pd.DataFrame(
+        {
+            "product_id": range(1, n + 1),
+            "name": [f"Granola {i}" for i in range(1, 41)] + [f"Crunch Granola {i}" for i in range(41, n + 1)],
+            "brand": ["H-E-B"] * n,
+            "category": ["Pantry"] * n,
+            "sub_category": ["Cereal"] * n,
+            "price": [4.0] * 40 + [3.0, 6.0, 3.5, 2.5, 3.0],
+            "ingredients": ["oats"] * n,
+            "attributes": ["vegetarian"] * 40 + ["nut_free"] * 5,
+        }
+    )
+    csr = _to_csr(build_graph(df))
+    derived = (kg_retriever._load_name_index, kg_retriever._load_attr_bits, kg_retriever._load_facet_postings)
+    monkeypatch.setattr(kg_retriever, "_load_csr", lambda: csr)
+    for loader in derived:
+        loader.cache_clear()
+    yield
+    for loader in derived:
+        loader.cache_clear()
+
+
+def _product_ids(results) -> list[int]:
+    return [r["payload"]["product_id"] for r in results if r["type"] == "product"]
+
+
+def test_kg_search_expansion_budget_counts_only_filtered_products(granola_graph) -> None:
+    assert len(_product_ids(kg_search("granola", k=3))) == 3
+    assert set(_product_ids(kg_search("nut-free granola", k=3))) <= {41, 42, 43, 44, 45}
+    assert len(_product_ids(kg_search("nut-free granola", k=3))) == 3
+    assert _product_ids(kg_search("nut-free granola under $3", k=8)) == [44, 41, 45]
@@ -1,6 +1,12 @@
+import logging
+import logging.handlers
+import queue
+import time
+
+import pandas as pd
 from _pytest.logging import LogCaptureFixture
 
-from config.logging_config import get_logger, log_function_call
+from config.logging_config import BufferedFileHandler, FlushingQueueListener, get_logger, log_function_call
 
 logger = get_logger(__name__)
 
@@ -39,3 +45,62 @@ def test_class_method(caplog: LogCaptureFixture) -> None:
         "Function tests.unittest.test_logging.method called by tests.unittest.test_logging.test_class_method ended in"
         in caplog.text
     )
+
+
+def test_disabled_logger_returns_function_unwrapped() -> None:
+    quiet_logger = get_logger("tests.unittest.quiet")
+    quiet_logger.setLevel(logging.INFO)
+
+    def quiet_function() -> str:
+        return "Quiet"
+
+    assert log_function_call(quiet_logger)(quiet_function) is quiet_function
+
+
+@log_function_call(logger)
+def summarized_function(frame: pd.DataFrame, items: list, flag: bool = False) -> int:
+    return len(frame) + len(items)
+
+
+def test_arg_summary_reports_shape_and_length(caplog: LogCaptureFixture) -> None:
+    frame = pd.DataFrame({"a": range(3), "b": range(3)})
+    assert summarized_function(frame, ["secret", "payload"], flag=True) == 5
+    assert "with args: frame=DataFrame(shape=(3, 2)), items=list(len=2), flag=bool" in caplog.text
+    assert "secret" not in caplog.text
+
+
+def _record(message: str) -> logging.LogRecord:
+    return logging.LogRecord("tests.unittest.buffered", logging.INFO, __file__, 0, message, None, None)
+
+
+def test_buffered_file_handler_flushes_on_interval_and_explicit_flush(tmp_path) -> None:
+    path = tmp_path / "run" / "std_logs.log"
+    handler = BufferedFileHandler(str(path), flush_interval=3600)
+    try:
+        handler.emit(_record("first"))
+        assert path.read_text() == ""  # still in the buffer
+        handler.flush()
+        assert path.read_text() == "first\n"
+        handler.flush_interval = 0
+        handler.emit(_record("second"))
+        assert path.read_text() == "first\nsecond\n"
+    finally:
+        handler.close()
+
+
+def test_flushing_queue_listener_flushes_idle_handlers(tmp_path) -> None:
+    path = tmp_path / "std_logs.log"
+    handler = BufferedFileHandler(str(path), flush_interval=3600)
+    log_queue: queue.Queue = queue.Queue()
+    listener = FlushingQueueListener(log_queue, handler)
+    listener.flush_interval = 0.01
+    listener.start()
+    try:
+        logging.handlers.QueueHandler(log_queue).handle(_record("before a quiet period"))
+        deadline = time.monotonic() + 5
+        while path.read_text() == "" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert path.read_text() == "before a quiet period\n"
+    finally:
+        listener.stop()
+        handler.close()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from sgs.phrases import compile_phrase_matcher
+from sgs.pipeline.program import _ATTR_SYNONYMS
+from sgs.retrievers.kg_retriever import ATTR_SYNONYMS
+
+
+def _naive(synonyms, text: str) -> set[str]:
+    return {key for key, phrases in synonyms.items() if any(p in text for p in phrases)}
+
+
+def test_overlapping_phrases_report_every_key() -> None:
+    match = compile_phrase_matcher(ATTR_SYNONYMS)
+    # One phrase, several attributes
+    assert match("granola with no sugar") == {"low_sugar", "zero_sugar"}
+    # A phrase inside a longer one ("protein" in "high protein") and inside a word ("kid" in "kids")
+    assert match("high protein bar") == {"high_protein"}
+    assert match("kids snack") == {"kids"}
+    # Several phrases in one query, some sharing a word ("less sodium", "less sugar")
+    assert match("nut free less sodium less sugar") == {"nut_free", "low_sodium", "low_sugar"}
+    assert match("peanut-free vegan") == {"nut_free", "vegan"}
+    assert match("plain oats") == set()
+    assert compile_phrase_matcher({})("no sugar") == set()
+
+
+def test_phrase_matcher_equals_substring_scan() -> None:
+    rng = np.random.default_rng(0)
+    for synonyms in (ATTR_SYNONYMS, _ATTR_SYNONYMS):
+        match = compile_phrase_matcher(synonyms)
+        # Queries glued from phrase fragments and filler, so phrases overlap, nest and get cut in half
+        pieces = [p for ps in synonyms.values() for p in ps] + ["no", "free", "high", "sugar", " ", "-", "x"]
+        pieces += [p[: len(p) // 2] for p in pieces] + [p[len(p) // 2 :] for p in pieces]
+        for _ in range(2000):
+            text = "".join(rng.choice(pieces, size=rng.integers(0, 6)))
+            assert match(text) == _naive(synonyms, text), text
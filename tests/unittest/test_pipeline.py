@@ -1,6 +1,69 @@
+import asyncio
+
+import pytest
+
+from sgs.pipeline import program
 from sgs.pipeline.program import GroceryRAG
 
 def test_pipeline_smoke():
     rag = GroceryRAG()
     res = rag("nut-free granola under $5")
     assert "suggestions" in res and "contexts" in res
+
+
+@pytest.fixture
+def hybrid(monkeypatch, products_df):
+    # Product 1's attributes contain "nut_free" only inside another token
+    catalog = products_df.assign(attributes=["vegetarian; nut_free_facility", "nut_free; vegetarian"])
+    monkeypatch.setattr(program, "load_products", lambda: catalog)
+    program._product_lookups.cache_clear()
+    yield program.HybridSearchProgram()
+    program._product_lookups.cache_clear()
+
+
+def _vec(query: str, k: int = 8) -> list[dict]:
+    return [
+        {"type": "text", "text": "Oat Granola (H-E-B) - $4.49 | Pantry/Cereal & Granola | attrs: vegetarian", "score": 0.9},
+        {"type": "text", "text": "Mystery Bar (Acme) - $1.99 | Snacks/Bars | attrs: ", "score": 0.5},
+    ]
+
+
+def _kg(query: str, k: int = 12) -> list[dict]:
+    card = {"brand": "H-E-B", "category": "Pantry", "sub_category": "Cereal & Granola"}
+    return [
+        {"type": "graph_fact", "text": "Product(nut-free granola) -[HAS_ATTRIBUTE]-> Attribute(nut_free)"},
+        {"type": "product", "payload": {**card, "product_id": 2, "name": "Nut-Free Granola", "price": 4.79}},
+        # No product_id (legacy graph): matched to the catalog by name, else kept as-is
+        {"type": "product", "payload": {**card, "product_id": None, "name": "Oat Granola", "price": 4.49}},
+        {"type": "product", "payload": {**card, "product_id": None, "name": "Legacy Crunch", "brand": "Acme", "price": 3.0}},
+    ]
+
+
+def _products(top: list[dict]) -> list[tuple]:
+    return [(c["product"], c["source"]) for c in top]
+
+
+def test_rank_orders_kg_then_vector_by_price(hybrid) -> None:
+    top, ctx = hybrid._rank("granola", _vec("granola"), _kg("granola"))
+    # KG hits first, then vector hits, each cheapest first; a name seen by both keeps the first (vector) entry
+    assert _products(top) == [
+        ("Legacy Crunch", "kg"), ("Nut-Free Granola", "kg"), ("Mystery Bar", "vector"), ("Oat Granola", "vector")
+    ]
+    assert top[3]["attributes"] == "vegetarian; nut_free_facility"  # enriched from the catalog by name
+    assert len(ctx) == 6 and ctx[2].startswith("Product(") and ctx[3].startswith("PRODUCT: Nut-Free Granola")
+
+
+def test_rank_applies_budget_and_whole_token_attributes(hybrid) -> None:
+    vec, kg = _vec(""), _kg("")
+    assert _products(hybrid._rank("granola under $4", vec, kg)[0]) == [("Legacy Crunch", "kg"), ("Mystery Bar", "vector")]
+    # "nut_free_facility" is not nut_free; products without a catalog entry have no attributes to match
+    assert _products(hybrid._rank("nut-free granola", vec, kg)[0]) == [("Nut-Free Granola", "kg")]
+    assert _products(hybrid._rank("vegetarian nut free", vec, kg)[0]) == [("Nut-Free Granola", "kg")]
+    assert _products(hybrid._rank("vegetarian under 4.50", vec, kg)[0]) == [("Oat Granola", "vector")]
+
+
+def test_aforward_matches_forward(hybrid, monkeypatch) -> None:
+    monkeypatch.setattr(program, "vector_search", _vec)
+    monkeypatch.setattr(program, "kg_search", _kg)
+    for query in ("granola", "nut-free granola under $5", "vegetarian"):
+        assert asyncio.run(hybrid.acall(query)) == hybrid(query)
@@ -0,0 +1,25 @@
+import os
+
+from sgs.config import settings
+from sgs.ingest import products
+from sgs.ingest.products import load_products, save_products_cache
+
+
+def test_products_cache_tracks_source_csv(tmp_path, monkeypatch, products_df) -> None:
+    csv = tmp_path / "products.csv"
+    monkeypatch.setattr(settings, "data_csv", str(csv))
+    monkeypatch.setattr(settings, "products_cache", str(tmp_path / "cache" / "products.pkl"))
+    products_df.to_csv(csv, index=False)
+    load_products.cache_clear()
+    try:
+        save_products_cache(load_products())
+        assert products._cache_is_fresh()
+
+        # A new catalog at DATA_CSV invalidates the pickle written from the old one
+        products_df.assign(product_id=[500, 501]).to_csv(csv, index=False)
+        os.utime(csv, ns=(0, 0))
+        load_products.cache_clear()
+        assert not products._cache_is_fresh()
+        assert load_products()["product_id"].tolist() == [500, 501]
+    finally:
+        load_products.cache_clear()
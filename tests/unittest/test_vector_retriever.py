@@ -0,0 +1,77 @@
+import json
+
+import faiss
+import numpy as np
+
+from sgs.config import settings
+from sgs.ingest.build_index import HNSW_SOURCE, build_hnsw_sibling
+from sgs.retrievers import vector_retriever
+from sgs.retrievers.vector_retriever import vector_search, vector_search_batch
+
+# Unit vectors per product (index order) and per query
+_PRODUCT_VECS = np.eye(4, dtype=np.float32)[:2]
+_QUERY_VECS = {
+    "oat": [1.0, 0.0, 0.0, 0.0],
+    "nut free": [0.0, 1.0, 0.0, 0.0],
+    "granola": [0.6, 0.8, 0.0, 0.0],
+    "tea": [0.0, 0.0, 1.0, 0.0],
+}
+
+
+class _StubEncoder:
+    def encode(self, queries, **_) -> np.ndarray:
+        return np.array([_QUERY_VECS[q] for q in queries], dtype=np.float32)
+
+
+def _use_stub_index(monkeypatch, products_df) -> None:
+    index = faiss.IndexFlatIP(4)
+    index.add(_PRODUCT_VECS)
+    monkeypatch.setattr(vector_retriever, "_get_model", lambda: _StubEncoder())
+    monkeypatch.setattr(vector_retriever, "_load_index", lambda: (index, np.array([1, 2], dtype=np.int64)))
+    monkeypatch.setattr(vector_retriever, "_load_products", lambda: products_df.set_index("product_id", drop=False))
+
+
+def test_vector_search_batch_matches_single_queries(monkeypatch, products_df) -> None:
+    _use_stub_index(monkeypatch, products_df)
+    queries = list(_QUERY_VECS)
+    for k in (1, 2, 5):  # k > ntotal: FAISS pads with -1, which must not become hits
+        batch = vector_search_batch(queries, k)
+        assert batch == [vector_search(q, k) for q in queries]
+        assert [len(hits) for hits in batch] == [min(k, 2)] * len(queries)
+    oat, nut_free, granola, _ = vector_search_batch(queries, 2)
+    assert oat[0]["text"].startswith("Oat Granola (H-E-B) - $4.49")
+    assert nut_free[0]["text"].startswith("Nut-Free Granola (H-E-B) - $4.79")
+    assert [h["score"] for h in granola] == np.float32([0.8, 0.6]).tolist()
+    assert vector_search_batch([], 3) == []
+
+
+def test_load_index_uses_hnsw_sibling_only_when_built_from_current_index(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    monkeypatch.setattr(vector_retriever, "FLAT_INDEX_WARN_NTOTAL", 0)
+    vecs = np.random.default_rng(0).standard_normal((20, 4)).astype(np.float32)
+
+    def write_flat(n: int) -> None:
+        flat = faiss.IndexFlatIP(4)
+        flat.add(vecs[:n])
+        faiss.write_index(flat, str(tmp_path / "products.index"))
+        (tmp_path / "meta.json").write_text(json.dumps({"mapping": [{"product_id": i} for i in range(n)]}))
+
+    def loaded() -> faiss.Index:
+        vector_retriever._load_index.cache_clear()
+        try:
+            return vector_retriever._load_index()[0]
+        finally:
+            vector_retriever._load_index.cache_clear()
+
+    write_flat(20)
+    build_hnsw_sibling(str(tmp_path))
+    assert isinstance(loaded(), faiss.IndexHNSW)
+    # products.index/meta.json rebuilt (fewer vectors) without rebuilding the sibling: keep the flat index
+    write_flat(12)
+    index = loaded()
+    assert isinstance(index, faiss.IndexFlat) and index.ntotal == 12
+    # A sibling without a recorded source (older builds) is not trusted either
+    build_hnsw_sibling(str(tmp_path))
+    assert isinstance(loaded(), faiss.IndexHNSW)
+    (tmp_path / HNSW_SOURCE).unlink()
+    assert isinstance(loaded(), faiss.IndexFlat)